@@ -30,6 +30,7 @@ const MAX_SEND_BURST_LEN: usize = 128 * BYTES_PER_BURST_PACKET;
 
 const READ_TIMEOUT: Duration = Duration::from_secs(1);
 const MAX_READ_RETRIES: usize = 3;
+const DRAIN_TIMEOUT: Duration = Duration::from_millis(100);
 
 #[repr(u8)]
 #[derive(Debug, Eq, PartialEq, IntoPrimitive, TryFromPrimitive, Copy, Clone)]
@@ -67,6 +68,36 @@ impl fmt::Display for FPGAModule {
     }
 }
 
+/// Determines how reads are retried: the first attempt waits `timeout` for responses, each retry
+/// waits `backoff` times longer (at most `max_timeout`). After a failed attempt, all packets that
+/// arrive within `drain` are discarded (with a zero duration, only the already received ones).
+#[derive(Copy, Clone, Debug)]
+pub struct RetryPolicy {
+    pub timeout: Duration,
+    pub backoff: f64,
+    pub max_timeout: Duration,
+    pub drain: Duration,
+    pub max_attempts: usize,
+}
+
+impl Default for RetryPolicy {
+    fn default() -> Self {
+        Self {
+            timeout: READ_TIMEOUT,
+            backoff: 1.0,
+            max_timeout: READ_TIMEOUT,
+            drain: DRAIN_TIMEOUT,
+            max_attempts: MAX_READ_RETRIES,
+        }
+    }
+}
+
+impl RetryPolicy {
+    fn next_timeout(&self, timeout: Duration) -> Duration {
+        cmp::min(timeout.mul_f64(self.backoff), self.max_timeout)
+    }
+}
+
 pub struct Communicator {
     addr: SockAddr,
     sock: Socket,
@@ -76,6 +107,16 @@ pub struct Communicator {
     received_pkts: VecDeque<Vec<u8>>,
 }
 
+struct ReadChunk {
+    req: usize,
+    target: FPGAModule,
+    mode: Mode,
+    addr: u32,
+    len: usize,
+    id: u32,
+    data: Vec<u8>,
+}
+
 enum NocPacket<'b> {
     Normal((FPGAModule, Mode, u32, &'b [u8])),
     Burst(&'b [u8]),
@@ -166,6 +207,23 @@ impl Communicator {
         ep: u16,
         data: &[u8],
     ) -> Result<()> {
+        self.append_msg(version, target, ep, data)?;
+        self.flush_packets()
+    }
+
+    pub fn send_bytes_vec(&mut self, version: u8, msgs: &[(FPGAModule, u16, &[u8])]) -> Result<()> {
+        if msgs.iter().any(|(_, _, data)| data.len() > MAX_SEND_BURST_LEN) {
+            return Err(Error::new(ErrorKind::InvalidInput, "message too large"));
+        }
+
+        // pack all messages into as few datagrams as possible
+        for (target, ep, data) in msgs {
+            self.append_msg(version, *target, *ep, data)?;
+        }
+        self.flush_packets()
+    }
+
+    fn append_msg(&mut self, version: u8, target: FPGAModule, ep: u16, data: &[u8]) -> Result<()> {
         #[repr(C, packed)]
         struct MessageHeader {
             other: u32,
@@ -237,10 +295,16 @@ impl Communicator {
             pos += BYTES_PER_BURST_PACKET;
         }
 
-        self.flush_packets()
+        Ok(())
     }
 
     pub fn receive(&mut self, timeout: Duration) -> Result<Vec<u8>> {
+        self.receive_msgs(timeout).map(|(data, _)| data)
+    }
+
+    /// Receives the next packet like `receive`, but additionally returns the offsets in the data
+    /// at which a burst, that is, a message starts.
+    pub fn receive_msgs(&mut self, timeout: Duration) -> Result<(Vec<u8>, Vec<usize>)> {
         // set custom timeout
         self.sock.set_read_timeout(Some(timeout))?;
         let res = self.do_receive();
@@ -249,7 +313,7 @@ impl Communicator {
         res
     }
 
-    fn do_receive(&mut self) -> Result<Vec<u8>> {
+    fn do_receive(&mut self) -> Result<(Vec<u8>, Vec<usize>)> {
         // either take a packet from our receive queue
         let (buf, size) = if let Some(pkt) = self.received_pkts.pop_front() {
             let size = pkt.len();
@@ -268,6 +332,7 @@ impl Communicator {
 
         let mut pos = 0;
         let mut res = vec![];
+        let mut starts = vec![];
         while pos + NOC_PACKET_LEN <= size {
             let noc_packet = self.decode_packet(&buf[pos..])?;
             match noc_packet {
@@ -281,6 +346,7 @@ impl Communicator {
 
                     if self.burst.is_some() {
                         debug!("Received burst-start from {} at offset {:#x}", src, off);
+                        starts.push(res.len());
                     }
                     else {
                         debug!(
@@ -297,16 +363,30 @@ impl Communicator {
             pos += NOC_PACKET_LEN;
         }
 
-        Ok(res)
+        Ok((res, starts))
     }
 
     pub fn read(
+        &mut self,
+        target: FPGAModule,
+        addr: u32,
+        len: usize,
+        nocarq: bool,
+    ) -> Result<Vec<u8>> {
+        self.read_with(target, addr, len, nocarq, &RetryPolicy::default())
+            .map(|(data, _)| data)
+    }
+
+    /// Reads `len` bytes at `addr` from `target`, retrying according to `policy`. Returns the data
+    /// and the number of retries.
+    pub fn read_with(
         &mut self,
         target: FPGAModule,
         mut addr: u32,
         mut len: usize,
         nocarq: bool,
-    ) -> Result<Vec<u8>> {
+        policy: &RetryPolicy,
+    ) -> Result<(Vec<u8>, usize)> {
         let mut buf: [MaybeUninit<u8>; UDP_PAYLOAD_LEN] = [MaybeUninit::uninit(); UDP_PAYLOAD_LEN];
         let mut res = Vec::with_capacity(len);
         let read_mode = if nocarq == true {
@@ -317,27 +397,33 @@ impl Communicator {
         };
 
         let mut retries = 0;
+        let mut total_retries = 0;
+        let mut timeout = policy.timeout;
         let mut last_addr = addr;
         while len > 0 {
+            self.sock.set_read_timeout(Some(timeout))?;
+            let res_len = res.len();
             match self.read_single(&mut buf, &mut res, target, read_mode, addr, len) {
                 Err(e) => {
                     error!("read request failed: {}", e);
 
-                    // receive all packets the FPGA sends us, with a timeout of 100ms
-                    self.sock
-                        .set_read_timeout(Some(Duration::from_millis(100)))?;
-                    while self.sock.recv_from(&mut buf[..]).is_ok() {}
-                    self.sock.set_read_timeout(Some(READ_TIMEOUT)).ok();
+                    // drop the partial data of the failed attempt; the retry requests it again
+                    res.truncate(res_len);
+                    self.drain(&mut buf, policy.drain)?;
+                    total_retries += 1;
 
                     // give up if the error persists for the same address
                     if last_addr == addr {
                         retries += 1;
-                        if retries >= MAX_READ_RETRIES {
+                        if retries >= policy.max_attempts {
+                            self.sock.set_read_timeout(Some(READ_TIMEOUT)).ok();
                             return Err(e);
                         }
+                        timeout = policy.next_timeout(timeout);
                     }
                     else {
                         retries = 0;
+                        timeout = policy.timeout;
                         last_addr = addr;
                     }
                 },
@@ -348,7 +434,182 @@ impl Communicator {
             }
         }
 
-        Ok(res)
+        self.sock.set_read_timeout(Some(READ_TIMEOUT)).ok();
+        Ok((res, total_retries))
+    }
+
+    /// Performs multiple reads of (target, addr, len, nocarq) at once. The read requests are sent
+    /// together (as long as the responses fit into the receive window) and the responses are
+    /// assigned to the requests based on their request id. Failed windows are retried according to
+    /// `policy`. Returns the data and the number of retries.
+    pub fn read_batch(
+        &mut self,
+        reqs: &[(FPGAModule, u32, usize, bool)],
+        policy: &RetryPolicy,
+    ) -> Result<(Vec<Vec<u8>>, usize)> {
+        let mut chunks = Vec::new();
+        for (req, &(target, addr, len, nocarq)) in reqs.iter().enumerate() {
+            let mode = if nocarq { Mode::ARQReadReq } else { Mode::ReadReq };
+            let mut off = 0;
+            while off < len {
+                let amount = cmp::min(MAX_READ_REQ_LEN, len - off);
+                chunks.push(ReadChunk {
+                    req,
+                    target,
+                    mode,
+                    addr: addr + off as u32,
+                    len: amount,
+                    id: 0,
+                    data: Vec::with_capacity(amount),
+                });
+                off += amount;
+            }
+        }
+
+        let mut buf: [MaybeUninit<u8>; UDP_PAYLOAD_LEN] = [MaybeUninit::uninit(); UDP_PAYLOAD_LEN];
+        let mut next = 0;
+        let mut retries = 0;
+        let mut total_retries = 0;
+        let mut timeout = policy.timeout;
+        while next < chunks.len() {
+            // issue as many requests as fit into the receive window
+            let mut end = next;
+            let mut inflight = 0;
+            while end < chunks.len() && (end == next || inflight + chunks[end].len <= MAX_READ_REQ_LEN)
+            {
+                inflight += chunks[end].len;
+                end += 1;
+            }
+
+            self.sock.set_read_timeout(Some(timeout))?;
+            match self.read_window(&mut buf, &mut chunks[next..end]) {
+                Err(e) => {
+                    error!("batched read request failed: {}", e);
+
+                    self.drain(&mut buf, policy.drain)?;
+                    total_retries += 1;
+
+                    retries += 1;
+                    if retries >= policy.max_attempts {
+                        self.sock.set_read_timeout(Some(READ_TIMEOUT)).ok();
+                        return Err(e);
+                    }
+                    timeout = policy.next_timeout(timeout);
+                },
+                Ok(_) => {
+                    next = end;
+                    retries = 0;
+                    timeout = policy.timeout;
+                },
+            }
+        }
+
+        self.sock.set_read_timeout(Some(READ_TIMEOUT)).ok();
+        let mut res = vec![Vec::new(); reqs.len()];
+        for c in chunks {
+            res[c.req].extend_from_slice(&c.data);
+        }
+        Ok((res, total_retries))
+    }
+
+    fn read_window(&mut self, buf: &mut [MaybeUninit<u8>], chunks: &mut [ReadChunk]) -> Result<()> {
+        // use disjoint request ids to be able to distinguish the responses
+        for c in chunks.iter_mut() {
+            c.data.clear();
+            c.id = self.next_req_id;
+            self.next_req_id = self.next_req_id.wrapping_add(c.len as u32);
+
+            let byte_count_bytes = ((c.len as u64) << 32 | c.id as u64).to_le_bytes();
+            let noc_packet = encode_packet(c.target, false, 0xFF, c.addr, &byte_count_bytes, c.mode);
+            self.append_packet(&noc_packet)?;
+        }
+        self.flush_packets()?;
+
+        let mut missing: usize = chunks.iter().map(|c| c.len).sum();
+        let mut cur: Option<usize> = None;
+        while missing > 0 {
+            let (size, _) = self.sock.recv_from(&mut buf[..])?;
+
+            // safety: buf[0..size] is now initialized, so resize it and transmute
+            let recv_buf: &[u8] = unsafe { transmute(&buf[0..size]) };
+
+            let mut pos = 0;
+            while pos + NOC_PACKET_LEN <= size {
+                let old_burst = self.burst;
+                let noc_packet = self.decode_packet(&recv_buf[pos..])?;
+
+                let (idx, data) = match noc_packet {
+                    NocPacket::Normal((src, mode, off, data)) => {
+                        if mode == Mode::WritePosted {
+                            debug!("Keeping packet with mode {:?} for later", mode);
+                            // keep the packet for later and go to the next UDP packet
+                            self.received_pkts.push_back(recv_buf[0..size].to_vec());
+                            self.burst = old_burst;
+                            break;
+                        }
+
+                        // ignore other packets
+                        if mode != Mode::ReadResp && mode != Mode::ARQReadResp {
+                            debug!("Ignoring packet with mode {:?}", mode);
+                            pos += NOC_PACKET_LEN;
+                            continue;
+                        }
+
+                        // find the request this response belongs to
+                        let idx = chunks.iter().position(|c| {
+                            off == c.id.wrapping_add(c.data.len() as u32) && c.data.len() < c.len
+                        });
+                        let idx = match idx {
+                            Some(idx) => idx,
+                            None => {
+                                debug!("Received packet with unexpected offset {:#x}", off);
+                                return Err(Error::from(ErrorKind::InvalidData));
+                            },
+                        };
+
+                        if self.burst.is_some() {
+                            debug!("Received burst-start from {} at offset {:#x}", src, off);
+                            cur = Some(idx);
+                            pos += NOC_PACKET_LEN;
+                            continue;
+                        }
+                        (idx, data)
+                    },
+                    NocPacket::Burst(data) => {
+                        let idx = cur.ok_or_else(|| Error::from(ErrorKind::InvalidData))?;
+                        if self.burst.is_none() {
+                            cur = None;
+                        }
+                        (idx, data)
+                    },
+                };
+
+                if chunks[idx].data.len() + data.len() > chunks[idx].len {
+                    return Err(Error::from(ErrorKind::InvalidData));
+                }
+                chunks[idx].data.extend(data.iter().rev());
+                missing -= data.len();
+                pos += NOC_PACKET_LEN;
+            }
+        }
+
+        Ok(())
+    }
+
+    fn drain(&mut self, buf: &mut [MaybeUninit<u8>], timeout: Duration) -> Result<()> {
+        if timeout.as_nanos() == 0 {
+            // only discard the packets that have already been received
+            self.sock.set_nonblocking(true)?;
+            while self.sock.recv_from(&mut buf[..]).is_ok() {}
+            self.sock.set_nonblocking(false)?;
+            return Ok(());
+        }
+
+        // receive all packets the FPGA sends us within the given timeout
+        self.sock.set_read_timeout(Some(timeout))?;
+        while self.sock.recv_from(&mut buf[..]).is_ok() {}
+        self.sock.set_read_timeout(Some(READ_TIMEOUT)).ok();
+        Ok(())
     }
 
     fn read_single(
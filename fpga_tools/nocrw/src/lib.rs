@@ -1,9 +1,13 @@
 mod com;
 
-use com::{Communicator, FPGAModule};
+use com::{Communicator, FPGAModule, RetryPolicy};
+use cpython::buffer::PyBuffer;
 use cpython::exc::TypeError;
 use cpython::PyErr;
-use cpython::{py_fn, py_module_initializer, PyBytes, PyResult, Python};
+use cpython::{
+    py_fn, py_module_initializer, PyBytes, PyList, PyObject, PyResult, PyTuple, Python, PythonObject,
+    ToPyObject,
+};
 use lazy_static::lazy_static;
 use log::{info, logger};
 use simplelog::{
@@ -12,7 +16,7 @@ use simplelog::{
 };
 use std::env;
 use std::fs::{create_dir, File};
-use std::io::BufWriter;
+use std::io::{BufWriter, ErrorKind};
 use std::str::FromStr;
 use std::sync::Mutex;
 use std::time::Duration;
@@ -30,7 +34,16 @@ py_module_initializer!(nocrw, |py, m| {
     m.add(
         py,
         "read_bytes",
-        py_fn!(py, read_bytes(chip_id: u8, mod_id: u8, addr: u32, len: u32)),
+        py_fn!(
+            py,
+            read_bytes(chip_id: u8, mod_id: u8, addr: u32, len: u32, policy: PolicyArgs)
+        ),
+    )?;
+
+    m.add(
+        py,
+        "read_batch",
+        py_fn!(py, read_batch(reqs: PyList, policy: PolicyArgs)),
     )?;
 
     m.add(
@@ -66,11 +79,23 @@ py_module_initializer!(nocrw, |py, m| {
         ),
     )?;
 
+    m.add(
+        py,
+        "send_bytes_vec",
+        py_fn!(py, send_bytes_vec(version: u8, msgs: PyList)),
+    )?;
+
     m.add(
         py,
         "receive_bytes",
         py_fn!(py, receive_bytes(timeout_ns: u64)),
     )?;
+
+    m.add(
+        py,
+        "receive_into",
+        py_fn!(py, receive_into(buf: PyObject, offset: usize, timeout_ns: u64)),
+    )?;
     Ok(())
 });
 
@@ -143,19 +168,87 @@ fn connect(
         .map_err(|e| PyErr::new::<TypeError, _>(py, format!("connect failed: {}", e)))
 }
 
-fn read_bytes(py: Python<'_>, chip_id: u8, mod_id: u8, addr: u32, len: u32) -> PyResult<PyBytes> {
+/// (timeout_ns, backoff, max_timeout_ns, drain_ns, max_attempts) as passed from Python
+type PolicyArgs = (u64, f64, u64, u64, usize);
+
+fn retry_policy(
+    (timeout_ns, backoff, max_timeout_ns, drain_ns, max_attempts): PolicyArgs,
+) -> RetryPolicy {
+    RetryPolicy {
+        timeout: Duration::from_nanos(timeout_ns),
+        backoff,
+        max_timeout: Duration::from_nanos(max_timeout_ns),
+        drain: Duration::from_nanos(drain_ns),
+        max_attempts,
+    }
+}
+
+fn read_bytes(
+    py: Python<'_>,
+    chip_id: u8,
+    mod_id: u8,
+    addr: u32,
+    len: u32,
+    policy: PolicyArgs,
+) -> PyResult<PyTuple> {
     info!(
-        "read_bytes(chip_id={}, mod_id={}, addr={:#x}, len={})",
-        chip_id, mod_id, addr, len
+        "read_bytes(chip_id={}, mod_id={}, addr={:#x}, len={}, policy={:?})",
+        chip_id, mod_id, addr, len, policy
     );
 
     let _g = LogGuard::default();
 
-    let mut guard = COM.lock().unwrap();
-    let com = guard.as_mut().unwrap();
-    com.read(FPGAModule::new(chip_id, mod_id), addr, len as usize, false)
-        .map(|bytes| PyBytes::new(py, &bytes))
-        .map_err(|e| PyErr::new::<TypeError, _>(py, format!("read_bytes failed: {}", e)))
+    let policy = retry_policy(policy);
+    // release the GIL during the transfer to let other Python threads run
+    py.allow_threads(|| {
+        let mut guard = COM.lock().unwrap();
+        let com = guard.as_mut().unwrap();
+        com.read_with(FPGAModule::new(chip_id, mod_id), addr, len as usize, false, &policy)
+    })
+    .map(|(bytes, retries)| {
+        PyTuple::new(
+            py,
+            &[
+                PyBytes::new(py, &bytes).into_object(),
+                retries.to_py_object(py).into_object(),
+            ],
+        )
+    })
+    .map_err(|e| PyErr::new::<TypeError, _>(py, format!("read_bytes failed: {}", e)))
+}
+
+fn read_batch(py: Python<'_>, reqs: PyList, policy: PolicyArgs) -> PyResult<PyTuple> {
+    let mut batch = Vec::new();
+    for req in reqs.iter(py) {
+        let (chip_id, mod_id, addr, len, nocarq): (u8, u8, u32, u32, bool) = req.extract(py)?;
+        batch.push((FPGAModule::new(chip_id, mod_id), addr, len as usize, nocarq));
+    }
+
+    info!("read_batch(count={}, policy={:?})", batch.len(), policy);
+
+    let _g = LogGuard::default();
+
+    let policy = retry_policy(policy);
+    let res = py.allow_threads(|| {
+        let mut guard = COM.lock().unwrap();
+        let com = guard.as_mut().unwrap();
+        com.read_batch(&batch, &policy)
+    });
+
+    res.map(|(all, retries)| {
+        let objs: Vec<PyObject> = all
+            .iter()
+            .map(|bytes| PyBytes::new(py, bytes).into_object())
+            .collect();
+        PyTuple::new(
+            py,
+            &[
+                PyList::new(py, &objs).into_object(),
+                retries.to_py_object(py).into_object(),
+            ],
+        )
+    })
+    .map_err(|e| PyErr::new::<TypeError, _>(py, format!("read_batch failed: {}", e)))
 }
 
 fn read8b_nocarq(py: Python<'_>, chip_id: u8, mod_id: u8, addr: u32) -> PyResult<PyBytes> {
@@ -257,14 +350,104 @@ fn send_bytes(
         .map_err(|e| PyErr::new::<TypeError, _>(py, format!("send_bytes failed: {}", e)))
 }
 
+fn send_bytes_vec(py: Python<'_>, version: u8, msgs: PyList) -> PyResult<u64> {
+    let mut objs = Vec::new();
+    for msg in msgs.iter(py) {
+        let (chip_id, mod_id, ep, b): (u8, u8, u16, PyBytes) = msg.extract(py)?;
+        objs.push((FPGAModule::new(chip_id, mod_id), ep, b));
+    }
+
+    info!("send_bytes_vec(version={}, count={})", version, objs.len());
+
+    let _g = LogGuard::default();
+
+    let batch: Vec<(FPGAModule, u16, &[u8])> =
+        objs.iter().map(|(target, ep, b)| (*target, *ep, b.data(py))).collect();
+    let res = py.allow_threads(|| {
+        let mut guard = COM.lock().unwrap();
+        let com = guard.as_mut().unwrap();
+        com.send_bytes_vec(version, &batch)
+    });
+
+    res.map(|_| 0)
+        .map_err(|e| PyErr::new::<TypeError, _>(py, format!("send_bytes_vec failed: {}", e)))
+}
+
 fn receive_bytes(py: Python<'_>, timeout_ns: u64) -> PyResult<PyBytes> {
     info!("receive_bytes(timeout={}ns)", timeout_ns);
 
     let _g = LogGuard::default();
 
-    let mut guard = COM.lock().unwrap();
-    let com = guard.as_mut().unwrap();
-    com.receive(Duration::from_nanos(timeout_ns))
-        .map(|payload| PyBytes::new(py, &payload))
-        .map_err(|e| PyErr::new::<TypeError, _>(py, format!("receive_bytes failed: {}", e)))
+    // release the GIL while waiting for a packet to let other Python threads run
+    py.allow_threads(|| {
+        let mut guard = COM.lock().unwrap();
+        let com = guard.as_mut().unwrap();
+        com.receive(Duration::from_nanos(timeout_ns))
+    })
+    .map(|payload| PyBytes::new(py, &payload))
+    .map_err(|e| PyErr::new::<TypeError, _>(py, format!("receive_bytes failed: {}", e)))
+}
+
+fn receive_into(py: Python<'_>, buf: PyObject, offset: usize, timeout_ns: u64) -> PyResult<PyTuple> {
+    info!("receive_into(offset={:#x}, timeout={}ns)", offset, timeout_ns);
+
+    let _g = LogGuard::default();
+
+    let pybuf = PyBuffer::get(py, &buf)?;
+    if pybuf.readonly() || !pybuf.is_c_contiguous() || offset > pybuf.len_bytes() {
+        return Err(PyErr::new::<TypeError, _>(
+            py,
+            "receive_into failed: invalid buffer or offset",
+        ));
+    }
+
+    let res = py.allow_threads(|| {
+        let mut guard = COM.lock().unwrap();
+        let com = guard.as_mut().unwrap();
+        com.receive_msgs(Duration::from_nanos(timeout_ns))
+    });
+    let (payload, starts) = match res {
+        Ok(res) => res,
+        // report timeouts as an empty receive to make polling cheap
+        Err(e) if e.kind() == ErrorKind::WouldBlock || e.kind() == ErrorKind::TimedOut => (vec![], vec![]),
+        Err(e) => {
+            return Err(PyErr::new::<TypeError, _>(
+                py,
+                format!("receive_into failed: {}", e),
+            ))
+        },
+    };
+
+    if offset + payload.len() > pybuf.len_bytes() {
+        return Err(PyErr::new::<TypeError, _>(
+            py,
+            format!(
+                "receive_into failed: {} bytes do not fit into buffer at offset {:#x}",
+                payload.len(),
+                offset
+            ),
+        ));
+    }
+
+    // safety: the buffer is writable, contiguous and large enough (checked above)
+    unsafe {
+        std::ptr::copy_nonoverlapping(
+            payload.as_ptr(),
+            (pybuf.buf_ptr() as *mut u8).add(offset),
+            payload.len(),
+        );
+    }
+
+    // the message starts are reported as offsets in the buffer
+    let starts: Vec<PyObject> = starts
+        .iter()
+        .map(|s| (offset + s).to_py_object(py).into_object())
+        .collect();
+    Ok(PyTuple::new(
+        py,
+        &[
+            payload.len().to_py_object(py).into_object(),
+            PyList::new(py, &starts).into_object(),
+        ],
+    ))
 }
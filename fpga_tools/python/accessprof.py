@@ -0,0 +1,195 @@
+"""
+this module records the memory accesses of the host and finds accesses that could be batched
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import memory
+import noc
+
+#the frames of these files are skipped when determining the call site of an access
+_SKIP_FILES = [os.path.abspath(memory.__file__), os.path.abspath(noc.__file__), os.path.abspath(__file__)]
+
+
+def _call_site():
+    frame = sys._getframe(2)
+    while frame is not None and os.path.abspath(frame.f_code.co_filename) in _SKIP_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return "%s:%d (%s)" % (os.path.basename(frame.f_code.co_filename), frame.f_lineno, frame.f_code.co_name)
+
+
+class AccessRecorder():
+    """
+    Records all reads and writes of the NoC interface (noc.NoCethernet), that is, the accesses via
+    memory.Memory (including mem[addr] accesses), read_batch and noc.NoCARQRegfile, with their call
+    site: the first caller outside of memory.py and noc.py. The registers of the NoC ARQ interface
+    are recorded with the module id (chip, modid, 'arq'). Example:
+
+        with AccessRecorder() as rec:
+            pm.tcu_get_ep(16)
+            ...
+        rec.print_report()
+
+    Each read is a round-trip to the FPGA, except for the requests of one read_batch, which count as
+    a single round-trip. Writes are posted. Messages sent or received by the host are not recorded.
+    The analysis reports:
+
+    - runs: sequences of accesses of the same kind to adjacent addresses of the same module that
+      could have been a single bulk access (interleaved accesses to other modules do not break a
+      run, so that loops over several modules are found as well). Requests of a read_batch are
+      not considered, because they are already batched.
+    - repeated reads: reads of the same range without an intervening write to it. These can also
+      be intentional polling of status registers.
+    - call sites: the call sites sorted by the number of round-trips they caused
+
+    At most <max_accesses> accesses are recorded; further accesses are only counted in dropped.
+    """
+    def __init__(self, max_accesses=1_000_000):
+        self.max_accesses = max_accesses
+        #(time, kind, nocid, addr, size, call site, batch id or None)
+        self.accesses = []
+        self.dropped = 0
+        self.batches = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        assert noc.NoCethernet.recorder is None, "another recorder is active"
+        noc.NoCethernet.recorder = self
+
+    def stop(self):
+        if noc.NoCethernet.recorder is self:
+            noc.NoCethernet.recorder = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def record(self, kind, nocid, addr, size):
+        site = _call_site()
+        with self.lock:
+            if len(self.accesses) >= self.max_accesses:
+                self.dropped += 1
+                return
+            self.accesses.append((time.time(), kind, tuple(nocid), addr, size, site, None))
+
+    def record_batch(self, reqs):
+        site = _call_site()
+        now = time.time()
+        with self.lock:
+            self.batches += 1
+            for (nocid, addr, size) in reqs:
+                if len(self.accesses) >= self.max_accesses:
+                    self.dropped += 1
+                    continue
+                self.accesses.append((now, 'r', tuple(nocid), addr, size, site, self.batches))
+
+    def runs(self, min_len=2):
+        """
+        Returns the runs of adjacent accesses with at least <min_len> accesses as list of dicts with
+        kind, nocid, addr, size, count and sites, sorted by the number of accesses
+        """
+        #the open run per (kind, nocid)
+        open_runs = {}
+        res = []
+        for (_, kind, nocid, addr, size, site, batch) in self.accesses:
+            if batch is not None:
+                continue
+            run = open_runs.get((kind, nocid))
+            if run is not None and run['addr'] + run['size'] == addr:
+                run['size'] += size
+                run['count'] += 1
+                run['sites'][site] += 1
+                continue
+            if run is not None and run['count'] >= min_len:
+                res.append(run)
+            open_runs[(kind, nocid)] = {
+                'kind': kind, 'nocid': nocid, 'addr': addr, 'size': size, 'count': 1, 'sites': Counter([site])
+            }
+        res += [run for run in open_runs.values() if run['count'] >= min_len]
+        return sorted(res, key=lambda run: -run['count'])
+
+    def repeated_reads(self, min_count=2):
+        """
+        Returns the ranges that have been read at least <min_count> times without an intervening
+        write as list of dicts with nocid, addr, size, count and sites, sorted by the count
+        """
+        #reads of (nocid, addr, size) since the last write to that range
+        reads = {}
+        res = []
+
+        def flush(key):
+            entry = reads.pop(key)
+            if entry['count'] >= min_count:
+                res.append(entry)
+
+        for (_, kind, nocid, addr, size, site, _) in self.accesses:
+            if kind == 'r':
+                entry = reads.get((nocid, addr, size))
+                if entry is None:
+                    entry = reads[(nocid, addr, size)] = {
+                        'nocid': nocid, 'addr': addr, 'size': size, 'count': 0, 'sites': Counter()
+                    }
+                entry['count'] += 1
+                entry['sites'][site] += 1
+            else:
+                for key in [k for k in reads if k[0] == nocid and k[1] < addr + size and addr < k[1] + k[2]]:
+                    flush(key)
+        for key in list(reads):
+            flush(key)
+        return sorted(res, key=lambda entry: -entry['count'])
+
+    def call_sites(self):
+        """
+        Returns a list of dicts with the number of round-trips (reads, counting each read_batch
+        once), reads, writes and bytes per call site, sorted by the number of round-trips
+        """
+        sites = {}
+        last_batch = None
+        for (_, kind, _, _, size, site, batch) in self.accesses:
+            entry = sites.get(site)
+            if entry is None:
+                entry = sites[site] = {'site': site, 'trips': 0, 'reads': 0, 'writes': 0, 'bytes': 0}
+            if kind == 'r':
+                entry['reads'] += 1
+                if batch is None or batch != last_batch:
+                    entry['trips'] += 1
+            else:
+                entry['writes'] += 1
+            entry['bytes'] += size
+            last_batch = batch
+        return sorted(sites.values(), key=lambda entry: (-entry['trips'], -entry['writes']))
+
+    def print_report(self, fh=sys.stdout, top=10):
+        reads = sum(1 for acc in self.accesses if acc[1] == 'r')
+        trips = sum(entry['trips'] for entry in self.call_sites())
+        fh.write("%d accesses (%d reads in %d round-trips, %d writes), %d dropped\n" % (
+            len(self.accesses), reads, trips, len(self.accesses) - reads, self.dropped))
+
+        def sites(counter):
+            return ", ".join("%s x%d" % (site, count) for (site, count) in counter.most_common(3))
+
+        fh.write("\nAdjacent accesses that could be one bulk access:\n")
+        for run in self.runs()[:top]:
+            fh.write("  %s %d:%d %#x..%#x: %d accesses, %d bytes; %s\n" % (
+                "read " if run['kind'] == 'r' else "write", run['nocid'][0], run['nocid'][1], run['addr'],
+                run['addr'] + run['size'], run['count'], run['size'], sites(run['sites'])))
+
+        fh.write("\nRepeated reads without intervening writes:\n")
+        for entry in self.repeated_reads()[:top]:
+            fh.write("  %d:%d %#x (%d bytes): %d reads; %s\n" % (
+                entry['nocid'][0], entry['nocid'][1], entry['addr'], entry['size'], entry['count'],
+                sites(entry['sites'])))
+
+        fh.write("\nCall sites by round-trips:\n")
+        fh.write("  {:>8} {:>8} {:>8} {:>10}  {}\n".format("trips", "reads", "writes", "bytes", "site"))
+        for entry in self.call_sites()[:top]:
+            fh.write("  {:>8} {:>8} {:>8} {:>10}  {}\n".format(
+                entry['trips'], entry['reads'], entry['writes'], entry['bytes'], entry['site']))
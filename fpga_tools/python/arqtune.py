@@ -0,0 +1,158 @@
+"""
+this module tunes the NoC ARQ settings (enable mode and RX timeout) per module
+"""
+import hashlib
+import json
+import os
+import time
+
+import noc
+from fpga_utils import FPGA_Error
+
+ARQ = noc.NoCARQRegfile
+
+
+def bitfile_key(bitfile):
+    """
+    Returns the key for the settings of the given bitfile (file name and hash, if it exists)
+    """
+    if os.path.isfile(bitfile):
+        h = hashlib.sha256()
+        with open(bitfile, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return "%s:%s" % (os.path.basename(bitfile), h.hexdigest()[:16])
+    return bitfile
+
+
+class ARQTuner():
+    """
+    Chooses the ARQ enable mode (see NoCARQRegfile.set_arq_enable) and RX timeout per module that
+    give the highest goodput without drops. For each candidate, a probe (write and read back
+    <probe_size> bytes at the probe address of the module) is run and the ARQ counters of the module
+    are read before and after with batched reads. Candidates with drops, corrupted data or errors
+    are rejected. Example:
+
+        tuner = ARQTuner(fpga_inst, probe_addrs={'PM': 0x10100000, 'DRAM': 0x0})
+        settings = tuner.tune()
+        tuner.save("arq_settings.json", "fpga.bit", settings)
+        ...
+        tuner.apply(ARQTuner.load("arq_settings.json", "fpga.bit"))
+
+    <probe_addrs> maps name prefixes of the modules (see FPGA_TOP.tcu_tiles) to the address of the
+    probe buffer; modules without probe address are not tuned. The probe overwrites the buffer.
+    """
+    MODES = [0, 1, 2]
+    TIMEOUTS = [100, 200, 500, 1000, 10000]
+    #the TX status registers, in the order of get_arq_tx_status
+    TX_REGS = [ARQ.REGADDR_NOC_TX_BVT_RD_PTR, ARQ.REGADDR_NOC_TX_BVT_OCC_PTR,
+               ARQ.REGADDR_NOC_TX_BVT_ACK_WR_PTR, ARQ.REGADDR_NOC_TX_BVT_MOD_WR_PTR]
+
+    def __init__(self, fpga, probe_addrs, probe_size=256 * 1024, modes=None, timeouts=None, repeats=3):
+        self.fpga = fpga
+        self.modes = modes if modes is not None else self.MODES
+        self.timeouts = timeouts if timeouts is not None else self.TIMEOUTS
+        self.probe_size = probe_size
+        self.repeats = repeats
+        self.modules = []
+        for (name, mem) in fpga.tcu_tiles():
+            for (prefix, addr) in probe_addrs.items():
+                if name.startswith(prefix):
+                    self.modules.append((name, mem, addr))
+                    break
+        #list of dicts, one per probe
+        self.results = []
+
+    def _counters(self, mems):
+        regs = [ARQ.REGADDR_NOC_RX_COUNT, ARQ.REGADDR_NOC_RX_DROP] + self.TX_REGS
+        reqs = [(mem.nocid, reg, 8, True) for mem in mems for reg in regs]
+        vals = [int.from_bytes(d[0:8], byteorder='little') for d in self.fpga.nocif.read_batch(reqs)]
+        return [vals[i:i + len(regs)] for i in range(0, len(vals), len(regs))]
+
+    def _probe(self, name, mem, addr, mode, timeout):
+        arq = ARQ(mem.nocid)
+        arq.set_arq_enable(mode)
+        if timeout is not None:
+            arq.set_arq_timeout(timeout)
+
+        data = os.urandom(self.probe_size)
+        [before] = self._counters([mem])
+        ok = True
+        start = time.time()
+        try:
+            for _ in range(self.repeats):
+                mem.write_bytes(addr, data, burst=addr % 16 == 0)
+                ok &= mem.read_bytes(addr, len(data)) == data
+        except Exception:
+            ok = False
+        elapsed = time.time() - start
+        [after] = self._counters([mem])
+
+        res = {
+            'module': name,
+            'mode': mode,
+            'timeout': timeout,
+            'ok': ok,
+            'goodput': 2 * self.repeats * len(data) / elapsed if ok else 0.0,
+            'rx': after[0] - before[0],
+            'drops': after[1] - before[1],
+            'tx_status': after[2:],
+        }
+        self.results.append(res)
+        print("%s: mode=%d timeout=%s: %s, %.2f MB/s, %d drops" % (
+            name, mode, "-" if timeout is None else timeout, "ok" if ok else "FAILED",
+            res['goodput'] / 1e6, res['drops']))
+        return res
+
+    def tune(self):
+        """
+        Probes all candidates for all modules and returns the best settings as dict of module name
+        to {'mode': mode, 'timeout': timeout}. The best settings are applied afterwards.
+        """
+        settings = {}
+        for (name, mem, addr) in self.modules:
+            best = None
+            for mode in self.modes:
+                #without ARQ, the timeout is not used
+                for timeout in ([None] if mode == 0 else self.timeouts):
+                    res = self._probe(name, mem, addr, mode, timeout)
+                    if res['ok'] and res['drops'] == 0 and (best is None or res['goodput'] > best['goodput']):
+                        best = res
+            if best is None:
+                raise FPGA_Error("%s: no working ARQ setting found" % name)
+            settings[name] = {'mode': best['mode'], 'timeout': best['timeout']}
+        self.apply(settings)
+        return settings
+
+    def apply(self, settings):
+        """
+        Applies the given settings (see tune)
+        """
+        for (name, mem) in self.fpga.tcu_tiles():
+            if name in settings:
+                arq = ARQ(mem.nocid)
+                arq.set_arq_enable(settings[name]['mode'])
+                if settings[name]['timeout'] is not None:
+                    arq.set_arq_timeout(settings[name]['timeout'])
+
+    def save(self, filename, bitfile, settings):
+        """
+        Stores the settings for the given bitfile in the JSON file <filename>, keeping the settings
+        of other bitfiles
+        """
+        all = {}
+        if os.path.isfile(filename):
+            with open(filename, 'r') as f:
+                all = json.load(f)
+        all[bitfile_key(bitfile)] = settings
+        with open(filename, 'w') as f:
+            json.dump(all, f, indent=2, sort_keys=True)
+
+    def load(filename, bitfile):
+        """
+        Returns the stored settings for the given bitfile or None
+        """
+        if not os.path.isfile(filename):
+            return None
+        with open(filename, 'r') as f:
+            return json.load(f).get(bitfile_key(bitfile))
@@ -0,0 +1,181 @@
+"""
+this module provides a compact representation of many EPs based on NumPy arrays
+"""
+import numpy as np
+
+from tcu import EP, MemEP, SendEP, RecvEP
+
+
+class EPRegs():
+    """
+    the registers of a single EP in an EPTable. Behaves like the list of registers used by EP, so
+    that EP objects can be views into the table.
+    """
+    __slots__ = ['regs', 'row']
+
+    def __init__(self, regs, row):
+        self.regs = regs
+        self.row = row
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, idx):
+        return int(self.regs[self.row, idx])
+
+    def __setitem__(self, idx, val):
+        self.regs[self.row, idx] = val & 0xFFFF_FFFF_FFFF_FFFF
+
+    def __iter__(self):
+        return (int(r) for r in self.regs[self.row])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class EPTable():
+    """
+    a table of EPs stored as (N, 3) array of 64-bit registers. The fields of all EPs can be accessed
+    at once as arrays, which can be used for boolean filtering. Example:
+
+        eps = EPTable.from_pm(fpga_inst.pms[0])
+        no_crd = eps[(eps.type == EP.SEND) & (eps.cur_crd == 0)]
+        for (ep_id, ep) in no_crd:
+            print(ep_id, ep)
+
+    Fields that only exist for some EP types (e.g., cur_crd) are 0 for EPs of other types.
+    """
+    #field name -> (register, shift, mask), for all EPs
+    COMMON_FIELDS = {
+        'type': (0, 0, 0x7),
+        'act': (0, 3, 0xFFFF),
+    }
+
+    #field name -> (register, shift, mask), per EP type
+    TYPE_FIELDS = {
+        EP.MEMORY: {
+            'flags': (0, 19, 0xF),
+            'tile': (0, 23, 0xFF),
+            'chip': (0, 31, 0x3F),
+            'addr': (1, 0, 0xFFFF_FFFF_FFFF_FFFF),
+            'size': (2, 0, 0xFFFF_FFFF_FFFF_FFFF),
+        },
+        EP.SEND: {
+            'cur_crd': (0, 19, 0x3F),
+            'max_crd': (0, 25, 0x3F),
+            'msg_size': (0, 31, 0x3F),
+            'crd_ep': (0, 37, 0xFFFF),
+            'is_reply': (0, 53, 0x1),
+            'ep': (1, 0, 0xFFFF),
+            'tile': (1, 16, 0xFF),
+            'chip': (1, 24, 0x3F),
+            'label': (2, 0, 0xFFFF_FFFF),
+        },
+        EP.RECEIVE: {
+            'reply_eps': (0, 19, 0xFFFF),
+            'slots': (0, 35, 0x3F),
+            'slot_size': (0, 41, 0x3F),
+            'wpos': (0, 47, 0x3F),
+            'rpos': (0, 53, 0x3F),
+            'buffer': (1, 0, 0xFFFF_FFFF_FFFF_FFFF),
+            'occupied': (2, 0, 0xFFFF_FFFF),
+            'unread': (2, 32, 0xFFFF_FFFF),
+        },
+    }
+
+    def __init__(self, regs, ids=None):
+        self.regs = np.asarray(regs, dtype=np.uint64).reshape(-1, 3)
+        self.ids = np.arange(len(self.regs), dtype=np.uint16) if ids is None else np.asarray(ids)
+
+    def from_bytes(data):
+        """
+        Creates a table from the raw EP registers (e.g., read from TCU.eps_addr())
+        """
+        return EPTable(np.frombuffer(data, dtype='<u8').copy())
+
+    def from_pm(pm):
+        """
+        Reads all EPs of the given PM with a single bulk transfer
+        """
+        return EPTable.from_bytes(pm.mem.read_bytes(pm.tcu.eps_addr(), pm.tcu.ep_count() * 3 * 8))
+
+    def from_eps(eps):
+        return EPTable([list(ep.regs) for ep in eps])
+
+    def __len__(self):
+        return len(self.regs)
+
+    def _extract(self, reg, shift, mask, rows=None):
+        vals = self.regs[:, reg] if rows is None else self.regs[rows, reg]
+        return (vals >> np.uint64(shift)) & np.uint64(mask)
+
+    def field(self, name):
+        """
+        Returns the given field of all EPs as array
+        """
+        if name in self.COMMON_FIELDS:
+            return self._extract(*self.COMMON_FIELDS[name])
+
+        res = np.zeros(len(self.regs), dtype=np.uint64)
+        known = False
+        types = self.field('type')
+        for (ty, fields) in self.TYPE_FIELDS.items():
+            if name in fields:
+                known = True
+                rows = types == ty
+                res[rows] = self._extract(*fields[name], rows=rows)
+        if not known:
+            raise AttributeError("EPTable has no field '%s'" % name)
+        return res
+
+    def __getattr__(self, name):
+        if name in ['regs', 'ids']:
+            raise AttributeError(name)
+        if name in self.COMMON_FIELDS or any(name in f for f in self.TYPE_FIELDS.values()):
+            return self.field(name)
+        raise AttributeError("'EPTable' object has no attribute '%s'" % name)
+
+    def __getitem__(self, idx):
+        """
+        Returns a new table with the selected EPs (boolean mask, slice or list of rows) or, for an
+        integer, a view of the EP in the given row
+        """
+        if isinstance(idx, (int, np.integer)):
+            return EP.from_regs(EPRegs(self.regs, idx))
+        return EPTable(self.regs[idx], self.ids[idx])
+
+    def __iter__(self):
+        for row in range(len(self.regs)):
+            yield (int(self.ids[row]), self[row])
+
+    def sends(self):
+        return self[self.field('type') == EP.SEND]
+
+    def recvs(self):
+        return self[self.field('type') == EP.RECEIVE]
+
+    def mems(self):
+        return self[self.field('type') == EP.MEMORY]
+
+    def changes(self, other):
+        """
+        Compares this table with another snapshot of the same EPs (see EP.diff). Returns a dict
+        with a boolean array for each kind of change ("config", "credits", "ring").
+        """
+        diff = self.regs ^ other.regs
+        types = other.field('type')
+        retyped = self.field('type') != types
+        static = np.full(self.regs.shape, 0xFFFF_FFFF_FFFF_FFFF, dtype=np.uint64)
+        res = {}
+        for (ty, cls) in [(EP.MEMORY, MemEP), (EP.SEND, SendEP), (EP.RECEIVE, RecvEP)]:
+            rows = (types == ty) & ~retyped
+            for (kind, masks) in cls.DYNAMIC.items():
+                masks = np.array(masks, dtype=np.uint64)
+                res.setdefault(kind, np.zeros(len(self.regs), dtype=bool))
+                res[kind] |= rows & (diff & masks).any(axis=1)
+                static[rows] &= ~masks
+        res['config'] = (diff & static).any(axis=1) | retyped
+        return res
@@ -0,0 +1,176 @@
+"""
+this module exports the counters of the FPGA in the Prometheus text format via HTTP
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import noc
+from tcu import TCUStatusReg
+
+
+class MetricsCollector():
+    """
+    Collects the board counters (router links, TCU flits, NoC ARQ and Ethernet status) of <fpga>
+    (a FPGA_TOP) with one batch of reads and the transfer statistics of the host. The result is
+    cached for <min_interval> seconds, so that any number of scrapers cause at most one sweep per
+    interval.
+
+    The router link counters are read without clearing them. Samplers that read and clear them
+    (e.g., monitor.LinkSampler) therefore disturb the exported values.
+
+    The host statistics are taken from a noc.Telemetry that is attached to the NoC interface until
+    close() is called.
+    """
+    #ethernet config registers 1-4: status vector, UDP status, RX UDP error, MAC status
+    ETH_STATUS = ['status_vector', 'udp_status', 'rx_udp_error', 'mac_status']
+
+    def __init__(self, fpga, min_interval=1.0):
+        self.fpga = fpga
+        self.min_interval = min_interval
+        self.tiles = fpga.tcu_tiles()
+        self.lock = threading.Lock()
+        self.sweeps = 0
+        self._last_time = None
+        self._text = ""
+        #wrap-corrected totals of the 32-bit TCU flit counters
+        self._flits_last = {}
+        self._flits_total = {}
+        self.telemetry = noc.Telemetry()
+        fpga.nocif.add_telemetry(self.telemetry)
+
+        self.reqs = []
+        #(kind, key) for each request
+        self.keys = []
+        for router in fpga.router:
+            for (link, req) in enumerate(router.flit_count_reqs()):
+                self.reqs.append(req)
+                self.keys.append(('link', (router.router_num, link)))
+        addr = fpga.tcu.status_reg_addr(TCUStatusReg.CTRL_FLIT_COUNT)
+        for (name, mem) in self.tiles:
+            self.reqs.append((mem.nocid, mem.offset + addr, 3 * 8))
+            self.keys.append(('flits', name))
+        for (name, mem) in self.tiles:
+            for (reg, metric) in [(noc.NoCARQRegfile.REGADDR_NOC_RX_COUNT, 'rx'),
+                                  (noc.NoCARQRegfile.REGADDR_NOC_RX_DROP, 'rx_drop')]:
+                self.reqs.append((mem.nocid, reg, 8, True))
+                self.keys.append(('arq', (name, metric)))
+        rf = fpga.eth_rf.rf
+        self.reqs.append((rf.nocid, rf.offset + fpga.tcu.config_reg_addr(1), len(self.ETH_STATUS) * 8))
+        self.keys.append(('eth', None))
+
+    def _sweep(self):
+        data = self.fpga.nocif.read_batch(self.reqs)
+        lines = []
+
+        def metric(name, type, help, samples):
+            lines.append("# HELP %s %s" % (name, help))
+            lines.append("# TYPE %s %s" % (name, type))
+            for (labels, val) in samples:
+                lbl = ",".join('%s="%s"' % (k, v) for (k, v) in labels)
+                lines.append("%s{%s} %d" % (name, lbl, val) if lbl else "%s %d" % (name, val))
+
+        links = []
+        flits = []
+        arq = []
+        for ((kind, key), d) in zip(self.keys, data):
+            if kind == 'link':
+                links.append(((('router', key[0]), ('link', key[1])), int.from_bytes(d, byteorder='little')))
+            elif kind == 'flits':
+                regs = [int.from_bytes(d[i:i + 8], byteorder='little') for i in range(0, 24, 8)]
+                vals = [('ctrl_tx', regs[0] >> 32), ('ctrl_rx', regs[0] & 0xFFFFFFFF),
+                        ('byp_tx', regs[1] >> 32), ('byp_rx', regs[1] & 0xFFFFFFFF),
+                        ('drop', regs[2] & 0xFFFFFFFF), ('error', regs[2] >> 32)]
+                for (counter, val) in vals:
+                    last = self._flits_last.get((key, counter))
+                    delta = val if last is None else (val - last) & 0xFFFFFFFF
+                    self._flits_last[(key, counter)] = val
+                    self._flits_total[(key, counter)] = self._flits_total.get((key, counter), 0) + delta
+                    flits.append(((('tile', key), ('counter', counter)), self._flits_total[(key, counter)]))
+            elif kind == 'arq':
+                arq.append(((('tile', key[0]), ('counter', key[1])), int.from_bytes(d[0:8], byteorder='little')))
+            else:
+                eth = [(((('register', reg),), int.from_bytes(d[i * 8:i * 8 + 8], byteorder='little')))
+                       for (i, reg) in enumerate(self.ETH_STATUS)]
+
+        nocif = self.fpga.nocif
+        ops = {}
+        for ((_, op), entry) in self.telemetry.snapshot().items():
+            (calls, bytes) = ops.get(op, (0, 0))
+            ops[op] = (calls + entry['calls'], bytes + entry['bytes'])
+        metric("fpga_router_link_flits", "gauge", "Flits counted on a router link since the last clear", links)
+        metric("fpga_tcu_flits_total", "counter", "Flits counted by the TCU of a tile", flits)
+        metric("fpga_nocarq_packets", "gauge", "Packets received by the NoC ARQ interface of a tile", arq)
+        metric("fpga_eth_status", "gauge", "Status registers of the Ethernet regfile", eth)
+        metric("fpga_host_ops_total", "counter", "NoC operations issued by the host",
+               [((('op', op),), calls) for (op, (calls, _)) in sorted(ops.items())])
+        metric("fpga_host_bytes_total", "counter", "Bytes transferred by the host",
+               [((('op', op),), bytes) for (op, (_, bytes)) in sorted(ops.items())])
+        metric("fpga_host_read_retries_total", "counter", "Read attempts repeated by the host",
+               [((), nocif.retries)])
+        metric("fpga_exporter_sweeps_total", "counter", "Sweeps over the board counters", [((), self.sweeps + 1)])
+        return "\n".join(lines) + "\n"
+
+    def collect(self):
+        """
+        Returns the metrics in the Prometheus text format, sweeping the board at most once per
+        <min_interval>
+        """
+        with self.lock:
+            now = time.time()
+            if self._last_time is None or now - self._last_time >= self.min_interval:
+                self._text = self._sweep()
+                self._last_time = now
+                self.sweeps += 1
+            return self._text
+
+    def close(self):
+        """
+        Detaches the telemetry from the NoC interface
+        """
+        self.fpga.nocif.remove_telemetry(self.telemetry)
+
+
+class Exporter(threading.Thread):
+    """
+    Serves the metrics of a MetricsCollector at http://<host>:<port>/metrics. Example:
+
+        exp = Exporter(MetricsCollector(fpga_inst), port=9464)
+        exp.start()
+        ...
+        exp.stop()
+    """
+    def __init__(self, collector, port=9464, host="127.0.0.1"):
+        self.collector = collector
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    body = collector.collect().encode()
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        super(Exporter, self).__init__()
+        self.daemon = True
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.join()
+        self.collector.close()
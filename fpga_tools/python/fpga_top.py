@@ -7,9 +7,13 @@ import dram
 import pm
 import uart
 import regfile
+import tculog
 from tcu import TCU
 
+import os
+import struct
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from ipaddress import IPv4Address
 
 
@@ -55,6 +59,7 @@ class FPGA_TOP(fpga):
             self.uart = uart.UART('/dev/ttyUSB1')
 
         tcu = TCU(version)
+        self.tcu = tcu
 
         #NOC
         self.nocif = noc.NoCethernet(tcu, (self.fpga_ip_addr, self.FPGA_PORT), chipid, reset)
@@ -75,6 +80,13 @@ class FPGA_TOP(fpga):
         self.pm_count = len(modids.MODID_PMS)
         self.pms = [pm.PM(tcu, self.nocif, (chipid, modids.MODID_PMS[x]), x) for x in range(self.pm_count)]
 
+    def tcu_tiles(self):
+        """
+        Returns a list of (name, memory) for all tiles with a TCU
+        """
+        tiles = [("ETH", self.eth_rf.rf), ("DRAM1", self.dram1.mem), ("DRAM2", self.dram2.mem)]
+        return tiles + [(pm.name, pm.mem) for pm in self.pms]
+
     def set_arq_enable(self, enabled):
         val = 1 if enabled else 0
         for pm in self.pms:
@@ -85,6 +97,95 @@ class FPGA_TOP(fpga):
         self.dram1.nocarq.set_arq_enable(val)
         self.dram2.nocarq.set_arq_enable(val)
 
+    def tcu_set_eps(self, layout, verify=False):
+        """
+        Configures the EPs of multiple PMs. <layout> is a dict of PM to a dict of EP id to EP (see
+        PM.tcu_set_eps). If <verify> is set, the EPs of all PMs are read back in a single batch.
+        """
+        for (pm, eps) in layout.items():
+            pm.tcu_set_eps(eps)
+
+        if verify:
+            reqs = [pm.tcu_ep_read_reqs(eps) for (pm, eps) in layout.items()]
+            data = self.nocif.read_batch([req for pm_reqs in reqs for req in pm_reqs])
+            pos = 0
+            for ((pm, eps), pm_reqs) in zip(layout.items(), reqs):
+                pm.tcu_verify_eps(eps, data[pos:pos + len(pm_reqs)])
+                pos += len(pm_reqs)
+
+    #the log memories are read in chunks of this size
+    LOG_READ_CHUNK = 16 * 1024
+    #the amount of log memory read per batch (a full log memory)
+    LOG_READ_BATCH = 1024 * 1024
+
+    def collect_logs(self, pms=None, out_dir="log", all=False, workers=None):
+        """
+        Collects the TCU logs of the given PMs (default: all) and stores them as text (same format as
+        PM.tcu_print_log) in <out_dir>/<pm>.log and raw (see tculog.TCULog) in <out_dir>/<pm>.tculog.
+        The log counters of all PMs are read in a single batch. The log memories are split into
+        chunks, which are read PM by PM with batches of LOG_READ_BATCH bytes, so that the logs are
+        completed one after another. As soon as the log of a PM is complete, it is formatted by a
+        pool of worker processes while the logs of the remaining PMs are read. Returns the list of
+        tculog.TCULog objects.
+        """
+        if pms is None:
+            pms = self.pms
+        os.makedirs(out_dir, exist_ok=True)
+
+        if all:
+            counts = [pm.TCU_LOG_SIZE for pm in pms]
+        else:
+            reqs = [(pm.nocid, self.tcu.log_addr(), 8) for pm in pms]
+            counts = [int.from_bytes(data, byteorder='little') for data in self.nocif.read_batch(reqs)]
+
+        #the chunks of all PMs in PM order: (pm index, request)
+        chunks = []
+        for (i, (pm, count)) in enumerate(zip(pms, counts)):
+            print("%s: Number of TCU log messages: %d" % (pm.name, count))
+            #first log is at TCU_REGADDR_TCU_LOG+0x10
+            start = pm.mem.offset + self.tcu.log_addr() + 0x10
+            size = min(count, pm.TCU_LOG_SIZE) * 16
+            chunks += [(i, (pm.mem.nocid, start + off, min(self.LOG_READ_CHUNK, size - off)))
+                       for off in range(0, size, self.LOG_READ_CHUNK)]
+        remaining = [sum(1 for (j, _) in chunks if j == i) for i in range(len(pms))]
+        data = [bytearray() for _ in pms]
+
+        logs = [None] * len(pms)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = []
+
+            def finish(i):
+                pm = pms[i]
+                words = list(struct.unpack('<%dQ' % (len(data[i]) // 8), data[i]))
+                log = tculog.TCULog(self.tcu.version, pm.nocid[1], counts[i], words)
+                log.save(os.path.join(out_dir, pm.shortname + ".tculog"))
+                jobs.append(pool.submit(log.write_text_file, os.path.join(out_dir, pm.shortname + ".log")))
+                logs[i] = log
+
+            #PMs without log entries are complete right away
+            for i in range(len(pms)):
+                if remaining[i] == 0:
+                    finish(i)
+
+            pos = 0
+            while pos < len(chunks):
+                end = pos
+                amount = 0
+                while end < len(chunks) and (end == pos or amount + chunks[end][1][2] <= self.LOG_READ_BATCH):
+                    amount += chunks[end][1][2]
+                    end += 1
+                batch = chunks[pos:end]
+                for ((i, _), d) in zip(batch, self.nocif.read_batch([req for (_, req) in batch])):
+                    data[i] += d
+                    remaining[i] -= 1
+                    if remaining[i] == 0:
+                        finish(i)
+                pos = end
+
+            for job in jobs:
+                job.result()
+        return logs
+
     def tear(self):
         self.noccomm.tear()
         self.uart.close()
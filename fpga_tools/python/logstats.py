@@ -0,0 +1,274 @@
+"""
+this module computes statistics over the TCU logs of multiple tiles (see tculog.py)
+"""
+import sys
+import math
+from collections import defaultdict
+
+from tcu import modid_to_tile, TCUError
+from tculog import TCULog
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile (nearest rank) of the given sorted list
+    """
+    if not values:
+        return None
+    rank = max(1, int(math.ceil(p / 100.0 * len(values))))
+    return values[rank - 1]
+
+
+class MsgLatency():
+    """
+    Determines the end-to-end latency of messages by pairing the log entries of sender and receiver:
+    - send: CMD_SEND at the sender until NOC_MSG at the receiver
+    - ack: CMD_SEND at the sender until NOC_MSG_ACK (or NOC_ACK_ERR) from the receiver
+    - finish: CMD_SEND at the sender until CMD_FINISH at the sender
+
+    The TCU time of all tiles is derived from the same clock, so that times of different logs are
+    comparable once the logs are aligned to a common wrap-around epoch (see TCULog.align). Pairs
+    whose times are at least half a wrap-around apart are dropped, because their order is
+    ambiguous. Messages from or to tiles without log (e.g., the host) only get ack and finish
+    latencies.
+    """
+    METRICS = ["send", "ack", "finish"]
+    UNPRIV_CMDS = ["CMD_REPLY", "CMD_READ", "CMD_WRITE", "CMD_FETCH", "CMD_ACK_MSG"]
+
+    def __init__(self, logs):
+        self.logs = logs
+        self.msgs = []
+        TCULog.align(logs)
+        self._collect()
+
+    def _collect(self):
+        #times of received messages per (receiver, sender)
+        received = defaultdict(list)
+        for log in self.logs:
+            for e in log.entries():
+                if e.id == "NOC_MSG":
+                    received[(log.modid, e.get('modid'))].append(e.time)
+
+        sent = defaultdict(list)
+        for log in self.logs:
+            pending = None
+            for e in log.entries():
+                if e.id == "CMD_SEND":
+                    pending = {
+                        'src': log.modid, 'dst': e.get('modid'), 'ep': e.get('ep'), 'size': e.get('size'),
+                        'time': e.time, 'send': None, 'ack': None, 'finish': None, 'error': None,
+                    }
+                elif pending is None:
+                    continue
+                elif e.id in self.UNPRIV_CMDS:
+                    #the next unpriv. command started, so that we missed the finish of the send
+                    pending = None
+                elif (e.id == "NOC_MSG_ACK" or e.id == "NOC_ACK_ERR") and e.get('modid') == pending['dst']:
+                    if pending['ack'] is None:
+                        pending['ack'] = e.time - pending['time']
+                elif e.id == "CMD_FINISH":
+                    pending['finish'] = e.time - pending['time']
+                    pending['error'] = e.get('error')
+                    #failed sends without ack (e.g., NO_CREDITS) never reached the receiver and
+                    #must not be paired with its receptions
+                    if pending['error'] == 0 or pending['ack'] is not None:
+                        sent[(pending['src'], pending['dst'])].append(pending)
+                    self.msgs.append(pending)
+                    pending = None
+
+        #messages between two tiles arrive in order, so that we can pair them in FIFO order. skip
+        #receptions that happened before the send (the log of the sender might be truncated)
+        for (key, msgs) in sent.items():
+            recv_times = received.get((key[1], key[0]), [])
+            pos = 0
+            for msg in msgs:
+                while pos < len(recv_times) and recv_times[pos] < msg['time']:
+                    pos += 1
+                if pos == len(recv_times):
+                    break
+                ack_time = msg['time'] + msg['ack'] if msg['ack'] is not None else None
+                if ack_time is not None and recv_times[pos] > ack_time:
+                    continue
+                if recv_times[pos] - msg['time'] >= TCULog.TIME_WRAP // 2:
+                    continue
+                msg['send'] = recv_times[pos] - msg['time']
+                pos += 1
+
+    def report(self):
+        """
+        Returns a list of dicts with the latency distribution in ns per source tile, destination
+        tile, send EP and message size
+        """
+        groups = defaultdict(list)
+        for msg in self.msgs:
+            groups[(msg['src'], msg['dst'], msg['ep'], msg['size'])].append(msg)
+
+        rows = []
+        for (src, dst, ep, size) in sorted(groups.keys()):
+            msgs = groups[(src, dst, ep, size)]
+            row = {
+                'src': modid_to_tile(src), 'dst': modid_to_tile(dst), 'ep': ep, 'size': size,
+                'count': len(msgs), 'errors': sum(1 for m in msgs if m['error'] != 0),
+            }
+            for metric in self.METRICS:
+                lats = sorted(m[metric] for m in msgs if m[metric] is not None)
+                row[metric + '_p50'] = percentile(lats, 50)
+                row[metric + '_p99'] = percentile(lats, 99)
+                row[metric + '_max'] = lats[-1] if lats else None
+            rows.append(row)
+        return rows
+
+    def print_report(self, fh=sys.stdout):
+        cols = ['src', 'dst', 'ep', 'size', 'count', 'errors']
+        for metric in self.METRICS:
+            cols += [metric + '_p50', metric + '_p99', metric + '_max']
+
+        fh.write(" ".join("{:>12}".format(c) for c in cols) + "\n")
+        for row in self.report():
+            vals = ["-" if row[c] is None else row[c] for c in cols]
+            fh.write(" ".join("{:>12}".format(v) for v in vals) + "\n")
+
+
+class ErrorStats():
+    """
+    Aggregates the error codes reported in the TCU logs per tile, EP and peer tile. Command errors
+    (CMD_FINISH, CMD_EXT_FINISH) are attributed to the EP and peer of the command they finish, NoC
+    errors (NOC_ACK_ERR, NOC_ERROR, ...) to the tile that sent the error. PMP_ACCESS_DENIED carries
+    no error code and is counted under its own name.
+
+    Additionally, bursts of errors that indicate credit starvation or NoC congestion are detected:
+    a burst are at least <burst_count> errors of the same code on the same tile within
+    <burst_window> ns.
+    """
+    BURST_ERRORS = ["NO_CREDITS", "RECV_NO_SPACE", "TIMEOUT_NOC"]
+    CMD_IDS = ["CMD_SEND", "CMD_REPLY", "CMD_READ", "CMD_WRITE", "CMD_FETCH", "CMD_ACK_MSG"]
+    NOC_ERROR_IDS = ["NOC_ACK_ERR", "NOC_ERROR", "NOC_ERROR_UNEXP", "NOC_READ_RSP_DONE"]
+
+    def __init__(self, logs, burst_window=100_000, burst_count=8):
+        self.burst_window = burst_window
+        self.burst_count = burst_count
+        #list of (tile, ep, peer, error name, time)
+        self.errors = []
+        #the (first, last) time of each log in ns
+        self.ranges = {}
+        TCULog.align(logs)
+        self._collect(logs)
+        self.bursts = self._find_bursts()
+
+    def _collect(self, logs):
+        for log in logs:
+            entries = log.entries()
+            if not entries:
+                continue
+            self.ranges[log.tile] = (entries[0].time, entries[-1].time)
+
+            cmd = None
+            ext_cmd = None
+            for e in entries:
+                if e.id in self.CMD_IDS:
+                    cmd = e
+                elif e.id == "CMD_EXT_INVEP":
+                    ext_cmd = e
+                elif e.id == "CMD_FINISH" or e.id == "CMD_PRIV_FINISH":
+                    self._add(log.tile, cmd, e, e.get('error'))
+                    cmd = None
+                elif e.id == "CMD_EXT_FINISH":
+                    self._add(log.tile, ext_cmd, e, e.get('error'))
+                    ext_cmd = None
+                elif e.id in self.NOC_ERROR_IDS or e.id == "PRIV_CORE_REQ_PMPFAIL":
+                    self._add(log.tile, None, e, e.get('error'))
+                elif e.id == "PMP_ACCESS_DENIED":
+                    self.errors.append((log.tile, None, None, e.id, e.time))
+
+    def _add(self, tile, cmd, e, error):
+        if error == 0:
+            return
+        ep = cmd.get('ep') if cmd is not None else None
+        peer = cmd.get('modid') if cmd is not None else e.get('modid')
+        peer = modid_to_tile(peer) if peer is not None else None
+        self.errors.append((tile, ep, peer, TCUError.print_error(error), e.time))
+
+    def _find_bursts(self):
+        times = defaultdict(list)
+        for (tile, _, _, error, time) in self.errors:
+            if error in self.BURST_ERRORS:
+                times[(tile, error)].append(time)
+
+        bursts = []
+        for ((tile, error), ts) in sorted(times.items()):
+            ts.sort()
+            start = None
+            for i in range(self.burst_count - 1, len(ts)):
+                if ts[i] - ts[i - self.burst_count + 1] > self.burst_window:
+                    continue
+                first = i - self.burst_count + 1
+                #extend the previous burst if the windows overlap
+                if start is not None and ts[first] <= bursts[-1]['end']:
+                    bursts[-1]['end'] = ts[i]
+                    bursts[-1]['count'] = i - start + 1
+                else:
+                    start = first
+                    bursts.append({'tile': tile, 'error': error, 'start': ts[first], 'end': ts[i],
+                                   'count': self.burst_count})
+        return bursts
+
+    def _union_span(self, tiles):
+        #the time covered by the logs of the given tiles, counting overlapping periods once
+        span = 0
+        end = None
+        for (first, last) in sorted(self.ranges[t] for t in tiles if t in self.ranges):
+            if end is None or first > end:
+                span += last - first
+                end = last
+            elif last > end:
+                span += last - end
+                end = last
+        return span
+
+    def counts(self, by=('tile',)):
+        """
+        Returns a list of dicts with count, rate, and first and last occurrence of each error,
+        grouped by the given keys out of 'tile', 'ep' and 'peer'. The rate is given per second of
+        the time covered by the logs of all tiles in the group (the union of their log spans), so
+        that groups spanning several tiles (e.g., by 'ep' or 'peer') are not related to the span of
+        a single tile.
+        """
+        keys = ['tile', 'ep', 'peer']
+        assert all(k in keys for k in by), "can only group by %s" % keys
+
+        groups = {}
+        for err in self.errors:
+            key = tuple(err[keys.index(k)] for k in by) + (err[3],)
+            if key not in groups:
+                groups[key] = {'count': 0, 'first': err[4], 'last': err[4], 'tiles': set()}
+            g = groups[key]
+            g['tiles'].add(err[0])
+            g['count'] += 1
+            g['first'] = min(g['first'], err[4])
+            g['last'] = max(g['last'], err[4])
+
+        rows = []
+        for key in sorted(groups.keys(), key=lambda k: tuple(str(x) for x in k)):
+            g = groups[key]
+            row = dict(zip(list(by) + ['error'], key))
+            span = self._union_span(g['tiles'])
+            row.update({
+                'count': g['count'],
+                'rate': g['count'] / (span / 1e9) if span > 0 else None,
+                'first': g['first'],
+                'last': g['last'],
+            })
+            rows.append(row)
+        return rows
+
+    def print_report(self, by=('tile', 'ep', 'peer'), fh=sys.stdout):
+        cols = list(by) + ['error', 'count', 'rate', 'first', 'last']
+        fh.write(" ".join("{:>18}".format(c) for c in cols) + "\n")
+        for row in self.counts(by):
+            vals = ["-" if row[c] is None else row[c] for c in cols]
+            vals = ["{:.1f}".format(v) if isinstance(v, float) else v for v in vals]
+            fh.write(" ".join("{:>18}".format(v) for v in vals) + "\n")
+
+        for b in self.bursts:
+            fh.write("WARN: burst of {} {} errors on {} between {} and {} ns\n".format(
+                b['count'], b['error'], b['tile'], b['start'], b['end']))
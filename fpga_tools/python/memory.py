@@ -2,6 +2,9 @@ from elftools.elf.elffile import ELFFile
 
 import difflib
 
+import noc
+from fpga_utils import FPGA_Error
+
 def bindiff(bin1, bin2):
     assert len(bin1) == len(bin2)
     for i in range(0, len(bin1), 16):
@@ -20,28 +23,29 @@ class Memory(object):
         self.ispe = ispe
         self.offset = offset
 
-    def read_word(self, addr):
+    def read_word(self, addr, policy=None):
         """
         read a single 64-bit integer from memory at given address
         """
-        return self.read_words(addr, 1)[0]
+        return self.read_words(addr, 1, policy)[0]
 
-    def read_words(self, addr, count):
+    def read_words(self, addr, count, policy=None):
         """
         read <count> 64-bit integers from memory at given address
         """
-        data = self.read_bytes(addr, count * 8)
+        data = self.read_bytes(addr, count * 8, policy)
         res = []
         for off in range(0, count * 8, 8):
             res.append(int.from_bytes(data[off:off + 8], byteorder='little'))
         return res
 
-    def read_bytes(self, addr, len):
+    def read_bytes(self, addr, len, policy=None):
         """
-        read bytes from memory at given address
+        read bytes from memory at given address. <policy> (a noc.RetryPolicy) overrides the retry
+        policy of the NoC interface.
         """
         assert isinstance(addr, int), "address must be an integer"
-        return self.nocif.read_bytes(self.nocid, addr + self.offset, len)
+        return self.nocif.read_bytes(self.nocid, addr + self.offset, len, policy)
 
     def write_word(self, addr, word):
         """
@@ -91,29 +95,88 @@ class Memory(object):
         assert isinstance(data, bytes), "data must be a byte-like object"
         return self.nocif.write_bytes(self.nocid, self.offset + addr, data, burst)
 
-    def write_bytes_checked(self, addr, data, burst=True):
+    def write_bytes_checked(self, addr, data, burst=True, policy=None):
         """
         writes bytes into memory at given address and checks whether the data has been written
-        correctly by reading it afterwards.
+        correctly by reading it afterwards. Each chunk is written at most <policy>.max_attempts
+        times (by default, the retry policy of the NoC interface), which is also used for the reads.
+        Returns the number of repeated chunk writes.
         """
+        if policy is None:
+            policy = self.nocif.policy
         # write+read in chunks of 1MB to on the one hand limit the amount of data we have to
         # retransmit in case of errors and on the other hand get reasonable speed by not-too-small
         # chunks.
+        retries = 0
         off = 0
         while off < len(data):
+            amount = min(1024 * 1024, len(data) - off)
             # try a few times to write that chunk to memory until we give up
-            for i in range(0, 3):
+            for i in range(0, policy.max_attempts):
+                if i > 0:
+                    retries += 1
                 try:
-                    amount = min(1024 * 1024, len(data) - off)
                     self.write_bytes(addr + off, data[off:off + amount], burst)
-                    written = self.read_bytes(addr + off, amount)
+                    written = self.read_bytes(addr + off, amount, policy)
                     if written == data[off:off + amount]:
                         break
-                except:
-                    continue
-            if i == 3:
-                assert False, "Unable to write bytes to {:#x}; giving up after 3 attempts".format(addr)
+                    print("WARN: data mismatch when writing {} bytes at {:#x}".format(amount, addr + off))
+                except (FPGA_Error, TypeError) as e:
+                    # nocrw reports errors as TypeError
+                    print("WARN: writing {} bytes at {:#x} failed: {}".format(amount, addr + off, e))
+            else:
+                assert False, "Unable to write bytes to {:#x}; giving up after {} attempts".format(
+                    addr + off, policy.max_attempts)
             off += amount
+        return retries
+
+    def write_bytes_paced(self, addr, data, pacer=None, burst=True, chunk_datagrams=16, check_every=4,
+                          max_attempts=10, verify=True):
+        """
+        writes bytes into memory at given address, paced by <pacer> (a noc.AIMDPacer; by default,
+        one that watches the drops of the host socket). The data is written in chunks of
+        <chunk_datagrams> datagrams. Every <check_every> chunks, the pacer checks for drops; if
+        there were any, the chunks since the last check are written again (at most <max_attempts>
+        times). Datagrams that are lost before they reach the NoC are not counted by any of the
+        drop counters, so that the written data is read back afterwards if <verify> is set and
+        mismatching parts are written again like in write_bytes_checked. Returns the pacer.
+        """
+        if pacer is None:
+            pacer = noc.AIMDPacer(monitor=noc.NoCmonitor(start=False))
+        arq = noc.NoCARQRegfile(self.nocid)
+        #initialize the drop counters
+        pacer.check(arq)
+
+        chunk = chunk_datagrams * pacer.DATAGRAM_DATA
+        off = 0
+        attempts = 0
+        while off < len(data):
+            start = off
+            for _ in range(check_every):
+                if off >= len(data):
+                    break
+                amount = min(chunk, len(data) - off)
+                pacer.wait(amount)
+                self.write_bytes(addr + off, data[off:off + amount], burst)
+                off += amount
+            if pacer.check(arq):
+                attempts += 1
+                assert attempts < max_attempts, \
+                    "Unable to write bytes to {:#x}; giving up after {} attempts".format(addr + start, attempts)
+                off = start
+            else:
+                attempts = 0
+
+        if verify:
+            #compare in chunks of 1MB like write_bytes_checked
+            off = 0
+            while off < len(data):
+                amount = min(1024 * 1024, len(data) - off)
+                if self.read_bytes(addr + off, amount) != data[off:off + amount]:
+                    print("WARN: data mismatch after paced write of {} bytes at {:#x}".format(amount, addr + off))
+                    self.write_bytes_checked(addr + off, data[off:off + amount], burst)
+                off += amount
+        return pacer
 
     def __repr__(self):
         return '<Memory Module:%d:%d>' % self.nocid
@@ -0,0 +1,636 @@
+"""
+this module contains samplers that periodically monitor the state of the FPGA
+"""
+import sys
+import threading
+import time
+
+import numpy as np
+
+import modids
+import noc
+from eptable import EPTable
+from tcu import EP, SendEP, TCUStatusReg
+
+
+def popcount(vals):
+    """
+    Returns the number of set bits of each value in the given uint64 array
+    """
+    octets = np.ascontiguousarray(vals, dtype='<u8').view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(octets, axis=1).sum(axis=1)
+
+
+class Sampler(threading.Thread):
+    """
+    base class for samplers that call sample() every <interval> seconds in a background thread.
+    The interval is increased if needed so that at most <max_bytes_per_sec> are read via the NoC.
+    """
+    def __init__(self, interval, max_bytes_per_sec=None):
+        self.interval = interval
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self.samples = 0
+        self.error = None
+        self._running = True
+        super(Sampler, self).__init__()
+        self.daemon = True
+
+    def bytes_per_sample(self):
+        return 0
+
+    def effective_interval(self):
+        if self.max_bytes_per_sec is None:
+            return self.interval
+        return max(self.interval, self.bytes_per_sample() / self.max_bytes_per_sec)
+
+    def stop(self):
+        self._running = False
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        interval = self.effective_interval()
+        next_time = time.time()
+        while self._running:
+            try:
+                self.sample()
+            except Exception as e:
+                self.error = e
+                return
+            #keep the sampling rate independent of the duration of sample()
+            next_time = max(next_time + interval, time.time())
+            time.sleep(max(next_time - time.time(), 0))
+
+    def sample(self):
+        pass
+
+
+class FlowMonitor(Sampler):
+    """
+    Samples the credits of send EPs and the ring occupancy of receive EPs. <eps> is a dict of PM to
+    a list of EP ids. The EPs of all PMs are read with one batch of bulk reads per sample.
+
+    The last <history> samples are kept in a ring buffer (see series()). For each EP, the ratio of
+    samples in which a send EP had no credits left (starvation) or a receive EP had all slots
+    occupied (ring full) is tracked over all samples. An EP is flagged as saturated if it has been
+    starved or full for at least <saturated_after> consecutive samples. Example:
+
+        mon = FlowMonitor({pm: [16, 17] for pm in fpga_inst.pms}, interval=0.001)
+        mon.start()
+        ...
+        mon.stop()
+        mon.print_report()
+    """
+    def __init__(self, eps, interval=0.01, history=4096, saturated_after=100, max_bytes_per_sec=1_000_000):
+        super(FlowMonitor, self).__init__(interval, max_bytes_per_sec)
+        self.pms = list(eps.keys())
+        self.reqs = []
+        #(pm, ep id) for each column
+        self.columns = []
+        for pm in self.pms:
+            ids = sorted(eps[pm])
+            self.reqs += pm.tcu_ep_read_reqs(dict.fromkeys(ids))
+            self.columns += [(pm, ep_id) for ep_id in ids]
+        self.nocif = self.pms[0].mem.nocif
+
+        self.history = history
+        self.saturated_after = saturated_after
+        n = len(self.columns)
+        self.times = np.zeros(history)
+        self.types = np.zeros((history, n), dtype=np.uint8)
+        self.credits = np.zeros((history, n), dtype=np.uint8)
+        self.occupied = np.zeros((history, n), dtype=np.uint8)
+        self.unread = np.zeros((history, n), dtype=np.uint8)
+        self.starved = np.zeros(n, dtype=np.int64)
+        self.full = np.zeros(n, dtype=np.int64)
+        self.run_len = np.zeros(n, dtype=np.int64)
+        self.max_run = np.zeros(n, dtype=np.int64)
+        self.lock = threading.Lock()
+
+    def bytes_per_sample(self):
+        return sum(req[2] for req in self.reqs)
+
+    def sample(self):
+        eps = EPTable.from_bytes(b''.join(self.nocif.read_batch(self.reqs)))
+        now = time.time()
+
+        types = eps.type
+        max_crd = eps.max_crd
+        starved = (types == EP.SEND) & (eps.cur_crd == 0) & (max_crd != SendEP.UNLIMITED_CRD)
+        occupied = popcount(eps.occupied)
+        full = (types == EP.RECEIVE) & (occupied >= (np.uint64(1) << eps.slots))
+
+        with self.lock:
+            pos = self.samples % self.history
+            self.times[pos] = now
+            self.types[pos] = types
+            self.credits[pos] = eps.cur_crd
+            self.occupied[pos] = occupied
+            self.unread[pos] = popcount(eps.unread)
+
+            self.starved += starved
+            self.full += full
+            saturated = starved | full
+            self.run_len = np.where(saturated, self.run_len + 1, 0)
+            self.max_run = np.maximum(self.max_run, self.run_len)
+            self.samples += 1
+
+        for i in np.nonzero(self.run_len == self.saturated_after)[0]:
+            (pm, ep_id) = self.columns[i]
+            print("WARN: %s EP%d is saturated for %d samples" % (pm.name, ep_id, self.saturated_after))
+
+    def series(self, pm, ep_id):
+        """
+        Returns the recorded samples of the given EP in chronological order as tuple of arrays
+        (times, credits, occupied slots, unread slots)
+        """
+        col = self.columns.index((pm, ep_id))
+        with self.lock:
+            count = min(self.samples, self.history)
+            order = (np.arange(count) + self.samples - count) % self.history
+            return (self.times[order], self.credits[order, col], self.occupied[order, col],
+                    self.unread[order, col])
+
+    def saturated(self):
+        """
+        Returns the (pm, ep id) of all EPs that are currently saturated
+        """
+        with self.lock:
+            return [self.columns[i] for i in np.nonzero(self.run_len >= self.saturated_after)[0]]
+
+    def report(self):
+        """
+        Returns a list of dicts with starvation and ring-full ratios per EP
+        """
+        rows = []
+        with self.lock:
+            samples = max(self.samples, 1)
+            last = (self.samples - 1) % self.history
+            for (i, (pm, ep_id)) in enumerate(self.columns):
+                rows.append({
+                    'pm': pm.name,
+                    'ep': ep_id,
+                    'type': int(self.types[last, i]),
+                    'starved': self.starved[i] / samples,
+                    'full': self.full[i] / samples,
+                    'max_run': int(self.max_run[i]),
+                    'saturated': bool(self.run_len[i] >= self.saturated_after),
+                })
+        return rows
+
+    def print_report(self, fh=sys.stdout):
+        types = {EP.INVALID: "Inv", EP.SEND: "Send", EP.RECEIVE: "Recv", EP.MEMORY: "Mem"}
+        fh.write("%d samples\n" % self.samples)
+        fh.write("{:>6} {:>5} {:>5} {:>8} {:>8} {:>8}\n".format("tile", "ep", "type", "starved", "full", "max_run"))
+        for row in self.report():
+            fh.write("{:>6} {:>5} {:>5} {:>7.1f}% {:>7.1f}% {:>8}{}\n".format(
+                row['pm'], row['ep'], types.get(row['type'], "?"), row['starved'] * 100, row['full'] * 100,
+                row['max_run'], " SATURATED" if row['saturated'] else ""))
+
+
+class LinkSampler(Sampler):
+    """
+    Samples the flit counters of all links of the given routers (e.g., FPGA_TOP.router). The
+    counters of all routers are read and cleared with one batch of reads per sample, so that each
+    sample yields the flits since the previous one. The last <history> samples are kept as flits/s
+    per link. Example:
+
+        links = LinkSampler(fpga_inst.router, interval=0.1)
+        links.start()
+        ...
+        links.stop()
+        print(links.heatmap(window=10))
+    """
+    def __init__(self, routers, interval=0.1, history=4096, max_bytes_per_sec=None):
+        super(LinkSampler, self).__init__(interval, max_bytes_per_sec)
+        self.routers = routers
+        self.reqs = []
+        #(router, link) for each column
+        self.columns = []
+        for router in routers:
+            reqs = router.flit_count_reqs(reset=1)
+            self.reqs += reqs
+            self.columns += [(router, link) for link in range(len(reqs))]
+        self.nocif = routers[0].mem.nocif
+
+        self.history = history
+        self.times = np.zeros(history)
+        self.rates = np.zeros((history, len(self.columns)))
+        self._last_time = None
+        self.lock = threading.Lock()
+
+    def bytes_per_sample(self):
+        return sum(req[2] for req in self.reqs)
+
+    def sample(self):
+        data = self.nocif.read_batch(self.reqs)
+        now = time.time()
+        counts = np.array([int.from_bytes(d, byteorder='little') for d in data], dtype=np.float64)
+
+        #the first read only clears the counters
+        last = self._last_time
+        self._last_time = now
+        if last is None:
+            return
+
+        with self.lock:
+            pos = self.samples % self.history
+            self.times[pos] = now
+            self.rates[pos] = counts / (now - last)
+            self.samples += 1
+
+    def _order(self):
+        count = min(self.samples, self.history)
+        return (np.arange(count) + self.samples - count) % self.history
+
+    def series(self, router, link):
+        """
+        Returns the recorded samples of the given link in chronological order as tuple of arrays
+        (times, flits/s)
+        """
+        col = self.columns.index((router, link))
+        with self.lock:
+            order = self._order()
+            return (self.times[order], self.rates[order, col])
+
+    def mean_rates(self, window=None):
+        """
+        Returns a dict of (router number, link) to the mean flits/s over the last <window> samples
+        (all recorded samples if None)
+        """
+        with self.lock:
+            order = self._order()
+            if window is not None:
+                order = order[-window:]
+            means = self.rates[order].mean(axis=0) if len(order) else np.zeros(len(self.columns))
+        return {(router.router_num, link): float(rate)
+                for ((router, link), rate) in zip(self.columns, means)}
+
+    def peak_rates(self):
+        """
+        Returns a dict of (router number, link) to the maximum flits/s over all recorded samples
+        """
+        with self.lock:
+            order = self._order()
+            peaks = self.rates[order].max(axis=0) if len(order) else np.zeros(len(self.columns))
+        return {(router.router_num, link): float(rate)
+                for ((router, link), rate) in zip(self.columns, peaks)}
+
+    def heatmap(self, window=None, capacity=None):
+        """
+        Renders the mean rates over the last <window> samples as heatmap (see render_link_heatmap)
+        """
+        return render_link_heatmap(self.routers, self.mean_rates(window), capacity)
+
+
+#characters for increasing link utilization
+HEAT_SHADES = " .:-=+*#%@"
+
+def _heat_cell(rate, scale):
+    level = 0 if scale == 0 else min(int(rate / scale * (len(HEAT_SHADES) - 1) + 0.5), len(HEAT_SHADES) - 1)
+    return "{:>8.3f} {}".format(rate / 1e6, HEAT_SHADES[level] * 3)
+
+def render_link_heatmap(routers, rates, capacity=None):
+    """
+    Renders the flits/s per link (dict of (router number, link) to rate) on the layout of the
+    routers in the mesh. Each router shows its module links and its internal link; the inter-router
+    links are shown between the routers with their direction as seen from the router that counts
+    them. Rates are given in Mflits/s and shaded relative to <capacity> in flits/s (the highest rate
+    if None).
+    """
+    scale = capacity if capacity is not None else max(rates.values(), default=0)
+    by_pos = {router.position(): router for router in routers}
+    xs = sorted(set(x for (x, _) in by_pos))
+    ys = sorted(set(y for (_, y) in by_pos))
+    width = 24
+
+    def box(router):
+        if router is None:
+            return [" " * width] * 6
+        lines = ["R%d (%d,%d)" % ((router.router_num,) + router.position())]
+        base = modids.MODID_ROUTER[router.router_num] & ~0x3
+        for link in range(3):
+            name = modids.MODID_TO_TILE.get(base | link, "%#04x" % (base | link))
+            lines.append("{:<6} {}".format(name, _heat_cell(rates.get((router.router_num, link), 0), scale)))
+        lines.append("{:<6} {}".format("int", _heat_cell(rates.get((router.router_num, 5), 0), scale)))
+        lines.append("")
+        return ["{:<{w}}".format(l, w=width) for l in lines]
+
+    def link(router, dir):
+        if router is None:
+            return ""
+        for (l, d) in router.link_directions().items():
+            if d == dir:
+                return "%s %s" % (d, _heat_cell(rates.get((router.router_num, l), 0), scale))
+        return ""
+
+    out = ["Mflits/s, scale %.3f Mflits/s ('%s')" % (scale / 1e6, HEAT_SHADES)]
+    for (row, y) in enumerate(ys):
+        if row > 0:
+            #vertical links between this and the previous row
+            for dir in ['S', 'N']:
+                y_from = ys[row - 1] if dir == 'S' else y
+                cells = [link(by_pos.get((x, y_from)), dir) for x in xs]
+                out.append("".join(("{:<%d}" % (width + 16)).format("  " + c) for c in cells).rstrip())
+        boxes = [box(by_pos.get((x, y))) for x in xs]
+        for i in range(6):
+            line = ""
+            for (col, x) in enumerate(xs):
+                line += boxes[col][i]
+                if col + 1 < len(xs):
+                    #horizontal links between this and the next router
+                    if i == 1:
+                        line += "{:<16}".format(link(by_pos.get((x, y)), 'E'))
+                    elif i == 2:
+                        line += "{:<16}".format(link(by_pos.get((xs[col + 1], y)), 'W'))
+                    else:
+                        line += " " * 16
+            out.append(line.rstrip())
+    return "\n".join(out)
+
+
+class FlitMonitor(Sampler):
+    """
+    Samples the flit counters of the TCUs of the given tiles, a list of (name, memory) as returned
+    by FPGA_TOP.tcu_tiles(). The status registers of all tiles are read with one batch of reads per
+    sample. The counters are 32 bit wide and wrap around, so that the interval must be short enough
+    that no counter advances by more than 2^32 between two samples.
+
+    The last <history> samples are kept as flits/s per tile and counter (see COUNTERS). Whenever the
+    rate of a counter exceeds its threshold in <thresholds> (dict of counter to flits/s), a warning
+    is printed and the alert is recorded in <alerts>. Example:
+
+        flits = FlitMonitor(fpga_inst.tcu, fpga_inst.tcu_tiles(), interval=0.1)
+        flits.start()
+        ...
+        flits.stop()
+        flits.print_report()
+    """
+    COUNTERS = ['ctrl_tx', 'ctrl_rx', 'byp_tx', 'byp_rx', 'drop', 'error']
+
+    def __init__(self, tcu, tiles, interval=0.1, history=4096, thresholds=None, max_bytes_per_sec=None):
+        super(FlitMonitor, self).__init__(interval, max_bytes_per_sec)
+        self.names = [name for (name, _) in tiles]
+        #CTRL_FLIT_COUNT, BYP_FLIT_COUNT and DROP_FLIT_COUNT are consecutive
+        addr = tcu.status_reg_addr(TCUStatusReg.CTRL_FLIT_COUNT)
+        self.reqs = [(mem.nocid, mem.offset + addr, 3 * 8) for (_, mem) in tiles]
+        self.nocif = tiles[0][1].nocif
+        self.thresholds = thresholds if thresholds is not None else {'drop': 0, 'error': 0}
+
+        self.history = history
+        n = len(tiles)
+        self.times = np.zeros(history)
+        self.rates = np.zeros((history, n, len(self.COUNTERS)))
+        #flits since the first sample
+        self.totals = np.zeros((n, len(self.COUNTERS)), dtype=np.int64)
+        #(time, tile, counter, flits/s)
+        self.alerts = []
+        self._alerting = np.zeros((n, len(self.COUNTERS)), dtype=bool)
+        self._last = None
+        self._last_time = None
+        self.lock = threading.Lock()
+
+    def bytes_per_sample(self):
+        return sum(req[2] for req in self.reqs)
+
+    def _counters(self, data):
+        regs = np.frombuffer(b''.join(data), dtype='<u8').reshape(-1, 3)
+        lo = regs & np.uint64(0xFFFF_FFFF)
+        hi = regs >> np.uint64(32)
+        #tx is in the upper half of the first two registers; errors in the upper half of the third
+        return np.stack([hi[:, 0], lo[:, 0], hi[:, 1], lo[:, 1], lo[:, 2], hi[:, 2]], axis=1).astype(np.int64)
+
+    def sample(self):
+        counters = self._counters(self.nocif.read_batch(self.reqs))
+        now = time.time()
+
+        last = self._last
+        last_time = self._last_time
+        self._last = counters
+        self._last_time = now
+        if last is None:
+            return
+
+        delta = (counters - last) & 0xFFFF_FFFF
+        rates = delta / (now - last_time)
+        thresholds = np.array([self.thresholds.get(c, np.inf) for c in self.COUNTERS])
+        exceeded = rates > thresholds
+
+        with self.lock:
+            pos = self.samples % self.history
+            self.times[pos] = now
+            self.rates[pos] = rates
+            self.totals += delta
+            self.samples += 1
+
+            #alert only when the threshold is crossed, not for every sample above it
+            new_alerts = exceeded & ~self._alerting
+            self._alerting = exceeded
+            for (t, c) in zip(*np.nonzero(new_alerts)):
+                self.alerts.append((now, self.names[t], self.COUNTERS[c], float(rates[t, c])))
+
+        for (t, c) in zip(*np.nonzero(new_alerts)):
+            print("WARN: %s: %.0f %s flits/s (threshold %g)" % (
+                self.names[t], rates[t, c], self.COUNTERS[c], thresholds[c]))
+
+    def series(self, name, counter):
+        """
+        Returns the recorded samples of the given tile and counter in chronological order as tuple
+        of arrays (times, flits/s)
+        """
+        t = self.names.index(name)
+        c = self.COUNTERS.index(counter)
+        with self.lock:
+            count = min(self.samples, self.history)
+            order = (np.arange(count) + self.samples - count) % self.history
+            return (self.times[order], self.rates[order, t, c])
+
+    def report(self):
+        """
+        Returns a list of dicts with the total flits and the mean and peak flits/s per tile and
+        counter over the recorded samples
+        """
+        rows = []
+        with self.lock:
+            count = min(self.samples, self.history)
+            rates = self.rates[:count]
+            for (t, name) in enumerate(self.names):
+                row = {'tile': name}
+                for (c, counter) in enumerate(self.COUNTERS):
+                    row[counter] = int(self.totals[t, c])
+                    row[counter + '_mean'] = float(rates[:, t, c].mean()) if count else 0.0
+                    row[counter + '_peak'] = float(rates[:, t, c].max()) if count else 0.0
+                rows.append(row)
+        return rows
+
+    def print_report(self, fh=sys.stdout):
+        fh.write("%d samples, mean (peak) flits/s\n" % self.samples)
+        fh.write("{:>6} ".format("tile") + " ".join("{:>21}".format(c) for c in self.COUNTERS) + "\n")
+        for row in self.report():
+            cells = ["{:>9.0f} ({:>9.0f})".format(row[c + '_mean'], row[c + '_peak']) for c in self.COUNTERS]
+            fh.write("{:>6} ".format(row['tile']) + " ".join(cells) + "\n")
+        for (t, name, counter, rate) in self.alerts:
+            fh.write("ALERT %s: %s %s %.0f flits/s\n" % (time.strftime("%H:%M:%S", time.localtime(t)), name, counter, rate))
+
+
+class LinkProber(Sampler):
+    """
+    Checks the health of the Ethernet link to the FPGA. Every <interval> seconds, <probes> small
+    reads of the status registers of the Ethernet regfile <eth_rf> are issued (one packet each), so
+    that every probe measures the round-trip time and reads the link state at once. The probes use
+    a short retry policy (<timeout> seconds, no retries), so that a lost probe is counted as timeout
+    instead of stalling the prober.
+
+    The RTTs are kept in a histogram (bin edges <bins> in seconds, logarithmic by default) and the
+    last <history> probes are kept for percentiles. The following degradations are reported as
+    warnings and recorded in <alerts> as (time, kind, message):
+
+    - spike: an RTT above <spike_factor> times the median RTT (and at least <spike_min> seconds)
+    - timeout: a probe that did not receive a response
+    - link: the internal PHY is not up and in sync
+    - udp_error: the RX UDP error register changed
+    - mac_status: the MAC status register changed
+
+    Example:
+
+        prober = LinkProber(fpga_inst.eth_rf, interval=1.0)
+        prober.start()
+        ...
+        prober.stop()
+        prober.print_report()
+    """
+    #config registers 1-4 of the Ethernet regfile
+    STATUS = ['status_vector', 'udp_status', 'rx_udp_error', 'mac_status']
+    #the number of probes before spikes are detected
+    WARMUP = 16
+
+    def __init__(self, eth_rf, interval=1.0, probes=4, history=4096, bins=None, timeout=0.05,
+                 spike_factor=5.0, spike_min=0.001):
+        super(LinkProber, self).__init__(interval)
+        rf = eth_rf.rf
+        self.nocif = rf.nocif
+        self.req = (rf.nocid, rf.offset + eth_rf.tcu.config_reg_addr(1), len(self.STATUS) * 8)
+        self.policy = noc.RetryPolicy(timeout=timeout, drain=0, max_attempts=1)
+        self.probes = probes
+        self.spike_factor = spike_factor
+        self.spike_min = spike_min
+
+        self.bins = np.asarray(bins) if bins is not None else np.logspace(-5, 0, 26)
+        self.hist = np.zeros(len(self.bins) + 1, dtype=np.int64)
+        self.history = history
+        self.times = np.zeros(history)
+        #NaN for probes that timed out
+        self.rtts = np.full(history, np.nan)
+        self.count = 0
+        self.timeouts = 0
+        self.status = None
+        self.alerts = []
+        self._spiking = False
+        self.lock = threading.Lock()
+
+    def bytes_per_sample(self):
+        return self.probes * self.req[2]
+
+    def _probe(self):
+        start = time.perf_counter()
+        try:
+            [data] = self.nocif.read_batch([self.req], self.policy)
+        except TypeError:
+            #nocrw reports timeouts as TypeError
+            return (None, None)
+        rtt = time.perf_counter() - start
+        return (rtt, [int.from_bytes(data[i:i + 8], byteorder='little') for i in range(0, len(data), 8)])
+
+    def _median(self):
+        count = min(self.count, self.history)
+        if count < self.WARMUP or np.all(np.isnan(self.rtts[:count])):
+            return None
+        return float(np.nanmedian(self.rtts[:count]))
+
+    def _alert(self, now, kind, msg):
+        self.alerts.append((now, kind, msg))
+        print("WARN: link: %s" % msg)
+
+    def sample(self):
+        for _ in range(self.probes):
+            (rtt, status) = self._probe()
+            now = time.time()
+            with self.lock:
+                median = self._median()
+                pos = self.count % self.history
+                self.times[pos] = now
+                self.rtts[pos] = np.nan if rtt is None else rtt
+                self.count += 1
+                if rtt is None:
+                    self.timeouts += 1
+                    self._alert(now, 'timeout', "probe timed out after %.0fms" % (self.policy.timeout * 1e3))
+                    continue
+                self.hist[np.searchsorted(self.bins, rtt)] += 1
+
+                #alert only when the spike starts, not for every probe within it
+                spiking = median is not None and rtt > max(median * self.spike_factor, self.spike_min)
+                if spiking and not self._spiking:
+                    self._alert(now, 'spike', "RTT %.3fms (median %.3fms)" % (rtt * 1e3, median * 1e3))
+                self._spiking = spiking
+
+                last = self.status
+                self.status = dict(zip(self.STATUS, status))
+                if (status[0] & 0x3) != 0x3 and (last is None or (last['status_vector'] & 0x3) == 0x3):
+                    self._alert(now, 'link', "link not up (status vector %#x)" % status[0])
+                if last is not None and status[2] != last['rx_udp_error']:
+                    self._alert(now, 'udp_error', "RX UDP error register changed from %#x to %#x" % (
+                        last['rx_udp_error'], status[2]))
+                if last is not None and status[3] != last['mac_status']:
+                    self._alert(now, 'mac_status', "MAC status changed from %#x to %#x" % (
+                        last['mac_status'], status[3]))
+        self.samples += 1
+
+    def rtt_series(self):
+        """
+        Returns the recorded probes in chronological order as tuple of arrays (times, RTTs), where
+        timed out probes have an RTT of NaN
+        """
+        with self.lock:
+            count = min(self.count, self.history)
+            order = (np.arange(count) + self.count - count) % self.history
+            return (self.times[order], self.rtts[order])
+
+    def report(self):
+        """
+        Returns a dict with the number of probes and timeouts, RTT percentiles (in seconds) over the
+        recorded probes, the last status registers and the number of alerts per kind
+        """
+        with self.lock:
+            count = min(self.count, self.history)
+            rtts = self.rtts[:count]
+            rtts = rtts[~np.isnan(rtts)]
+            res = {
+                'probes': self.count,
+                'timeouts': self.timeouts,
+                'status': dict(self.status) if self.status is not None else None,
+                'alerts': {},
+            }
+            for (name, q) in [('min', 0), ('p50', 50), ('p90', 90), ('p99', 99), ('max', 100)]:
+                res[name] = float(np.percentile(rtts, q)) if len(rtts) else None
+            for (_, kind, _) in self.alerts:
+                res['alerts'][kind] = res['alerts'].get(kind, 0) + 1
+        return res
+
+    def print_report(self, fh=sys.stdout, width=40):
+        res = self.report()
+        fh.write("%d probes, %d timeouts\n" % (res['probes'], res['timeouts']))
+        if res['min'] is not None:
+            fh.write("RTT: " + " ".join("%s=%.3fms" % (name, res[name] * 1e3)
+                                        for name in ['min', 'p50', 'p90', 'p99', 'max']) + "\n")
+        with self.lock:
+            hist = self.hist.copy()
+        peak = max(int(hist.max()), 1)
+        edges = [0.0] + list(self.bins) + [np.inf]
+        for i in np.nonzero(hist)[0]:
+            label = "%.3f-%.3fms" % (edges[i] * 1e3, edges[i + 1] * 1e3)
+            fh.write("{:>20} {:>8} {}\n".format(label, hist[i], "#" * max(1, int(hist[i] * width / peak))))
+        if res['status'] is not None:
+            fh.write("status: " + " ".join("%s=%#x" % (k, res['status'][k]) for k in self.STATUS) + "\n")
+        for (t, kind, msg) in self.alerts:
+            fh.write("ALERT %s: %s: %s\n" % (time.strftime("%H:%M:%S", time.localtime(t)), kind, msg))
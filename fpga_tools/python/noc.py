@@ -1,62 +1,346 @@
 """
 this module implements the driver for the NoC access via ethernet based on a Rust backend
 """
+import sys
 import threading
 import time
-import re
+import struct
+import queue
+from contextlib import contextmanager
 
 from fpga_utils import FPGA_Error
 
 import nocrw
 
+class RetryPolicy(object):
+    """
+    Determines how reads are retried on timeouts and errors. The first attempt waits <timeout>
+    seconds for the responses and every further attempt <backoff> times longer, but at most
+    <max_timeout> seconds. After a failed attempt, all packets arriving within <drain> seconds are
+    discarded; with drain=0, only the packets that have already been received are discarded. A read
+    fails after <max_attempts> failed attempts for the same data.
+    """
+    def __init__(self, timeout=1.0, backoff=1.0, max_timeout=None, drain=0.1, max_attempts=3):
+        assert timeout > 0, "timeout must be positive"
+        assert backoff >= 1.0, "backoff must be at least 1"
+        assert drain >= 0, "drain must not be negative"
+        assert max_attempts >= 1, "max_attempts must be at least 1"
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_timeout = max_timeout if max_timeout is not None else timeout
+        assert self.max_timeout >= timeout, "max_timeout must not be below timeout"
+        self.drain = drain
+        self.max_attempts = max_attempts
+
+    def replace(self, **kwargs):
+        """
+        Returns a copy of this policy with the given attributes changed
+        """
+        args = dict(timeout=self.timeout, backoff=self.backoff, max_timeout=self.max_timeout,
+                    drain=self.drain, max_attempts=self.max_attempts)
+        args.update(kwargs)
+        return RetryPolicy(**args)
+
+    def args(self):
+        """
+        Returns the policy in the form expected by nocrw
+        """
+        return (int(self.timeout * 1e9), float(self.backoff), int(self.max_timeout * 1e9),
+                int(self.drain * 1e9), self.max_attempts)
+
+    def __repr__(self):
+        return "RetryPolicy(timeout={}, backoff={}, max_timeout={}, drain={}, max_attempts={})".format(
+            self.timeout, self.backoff, self.max_timeout, self.drain, self.max_attempts)
+
+class Telemetry(object):
+    """
+    Collects statistics about the operations of a NoCethernet per (trg_id, op): the number of
+    calls, the transferred bytes, the time spent in the transport and a latency histogram with
+    power-of-two buckets (bucket 0 counts operations below 1us, bucket i operations within
+    [2^(i-1), 2^i) us). Writes are additionally counted as burst and non-burst writes.
+
+    Batched operations (read_batch, send_bytes_vec) are recorded per request with an equal share of
+    the time of the batch. Received packets are recorded with trg_id None.
+
+    A Telemetry only collects data while it is added to a NoCethernet (see NoCethernet.measure and
+    NoCethernet.add_telemetry). The wall time in which it was added is available via wall_time,
+    which allows to compare the time spent in the transport with the overall time.
+    """
+    BUCKETS = 24
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.wall_time = 0.0
+
+    def _new_entry(self):
+        return {'calls': 0, 'bytes': 0, 'time': 0.0, 'burst': 0, 'nonburst': 0, 'hist': [0] * self.BUCKETS}
+
+    def record(self, trg_id, op, bytes, elapsed, burst=None):
+        bucket = min(int(elapsed * 1e6).bit_length(), self.BUCKETS - 1)
+        with self.lock:
+            entry = self.stats.get((trg_id, op))
+            if entry is None:
+                entry = self.stats[(trg_id, op)] = self._new_entry()
+            entry['calls'] += 1
+            entry['bytes'] += bytes
+            entry['time'] += elapsed
+            entry['hist'][bucket] += 1
+            if burst is not None:
+                entry['burst' if burst else 'nonburst'] += 1
+
+    def snapshot(self):
+        """
+        Returns a copy of the statistics as dict of (trg_id, op) to a dict with calls, bytes, time
+        (in seconds), burst and nonburst (the number of burst and non-burst writes) and hist
+        """
+        with self.lock:
+            return {key: dict(entry, hist=list(entry['hist'])) for (key, entry) in self.stats.items()}
+
+    def reset(self):
+        """
+        Discards all statistics
+        """
+        with self.lock:
+            self.stats = {}
+            self.wall_time = 0.0
+
+    def percentile(hist, q):
+        """
+        Returns the upper bound of the bucket (in seconds) that contains the <q>th percentile of the
+        given histogram
+        """
+        total = sum(hist)
+        if total == 0:
+            return 0.0
+        seen = 0
+        for (i, count) in enumerate(hist):
+            seen += count
+            if seen * 100 >= total * q:
+                return (1 << i) / 1e6
+        return (1 << (len(hist) - 1)) / 1e6
+
+    def print_report(self, fh=sys.stdout):
+        stats = self.snapshot()
+        transport = sum(entry['time'] for entry in stats.values())
+        calls = sum(entry['calls'] for entry in stats.values())
+        fh.write("%d operations, %.3fs in transport" % (calls, transport))
+        if self.wall_time > 0:
+            fh.write(" of %.3fs wall time (%.1f%%)" % (self.wall_time, transport * 100 / self.wall_time))
+        fh.write("\n")
+        fh.write("{:>10} {:>14} {:>8} {:>12} {:>10} {:>9} {:>9} {:>13}\n".format(
+            "target", "op", "calls", "bytes", "time", "p50", "p99", "burst/single"))
+        for ((trg_id, op), entry) in sorted(stats.items(), key=lambda e: -e[1]['time']):
+            fh.write("{:>10} {:>14} {:>8} {:>12} {:>9.3f}s {:>7.0f}us {:>7.0f}us {:>13}\n".format(
+                "-" if trg_id is None else "%d:%d" % tuple(trg_id), op, entry['calls'], entry['bytes'],
+                entry['time'], Telemetry.percentile(entry['hist'], 50) * 1e6,
+                Telemetry.percentile(entry['hist'], 99) * 1e6,
+                "%d/%d" % (entry['burst'], entry['nonburst']) if op == "write" else ""))
+
 class NoCethernet(object):
-    def __init__(self, tcu, send_ipaddr, chip_id, reset):
+    """
+    The reads are retried according to <policy> (a RetryPolicy), which can be overridden per call.
+    The number of retries of the last read is available via last_retries and the total number via
+    retries.
+
+    The operations can be recorded by Telemetry objects, either permanently (add_telemetry) or for
+    a code region:
+
+        with fpga_inst.nocif.measure() as tel:
+            ...
+        tel.print_report()
+    """
+    #if set, all reads and writes (including those of NoCARQRegfile) are reported to
+    #recorder.record(kind, nocid, addr, size) with kind 'r' or 'w' and the requests of read_batch
+    #to recorder.record_batch([(nocid, addr, size)]) (see accessprof.AccessRecorder)
+    recorder = None
+
+    def __init__(self, tcu, send_ipaddr, chip_id, reset, policy=None):
         self.tcu = tcu
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.retries = 0
+        self.last_retries = 0
+        #the active Telemetry objects
+        self.telemetry = []
         nocrw.connect(send_ipaddr[0], send_ipaddr[1], chip_id, reset)
 
-    def read_bytes(self, trg_id, addr, len):
-        return nocrw.read_bytes(trg_id[0], trg_id[1], addr, len)
+    def _record(self, start, ops, burst=None):
+        share = (time.perf_counter() - start) / len(ops)
+        for tel in self.telemetry:
+            for (trg_id, op, bytes) in ops:
+                tel.record(trg_id, op, bytes, share, burst)
+
+    def add_telemetry(self, tel):
+        self.telemetry = self.telemetry + [tel]
+
+    def remove_telemetry(self, tel):
+        self.telemetry = [t for t in self.telemetry if t is not tel]
+
+    @contextmanager
+    def measure(self, tel=None):
+        """
+        Records all operations within the with-block in <tel> (a new Telemetry by default)
+        """
+        tel = tel if tel is not None else Telemetry()
+        self.add_telemetry(tel)
+        start = time.perf_counter()
+        try:
+            yield tel
+        finally:
+            tel.wall_time += time.perf_counter() - start
+            self.remove_telemetry(tel)
+
+    def _retried(self, retries):
+        self.last_retries = retries
+        self.retries += retries
+
+    def read_bytes(self, trg_id, addr, len, policy=None):
+        if NoCethernet.recorder is not None:
+            NoCethernet.recorder.record('r', trg_id, addr, len)
+        policy = policy if policy is not None else self.policy
+        start = time.perf_counter() if self.telemetry else None
+        (data, retries) = nocrw.read_bytes(trg_id[0], trg_id[1], addr, len, policy.args())
+        if start is not None:
+            self._record(start, [(trg_id, "read", len)])
+        self._retried(retries)
+        return data
+
+    def read_batch(self, reqs, policy=None):
+        """
+        Performs multiple reads at once. <reqs> is a list of (trg_id, addr, len) or (trg_id, addr,
+        len, nocarq) tuples. Returns a list with the read bytes for each request.
+        """
+        batch = []
+        for req in reqs:
+            nocarq = req[3] if len(req) > 3 else False
+            batch.append((req[0][0], req[0][1], req[1], req[2], nocarq))
+        if NoCethernet.recorder is not None:
+            NoCethernet.recorder.record_batch([((req[0], req[1], 'arq') if req[4] else (req[0], req[1]),
+                                                req[2], req[3]) for req in batch])
+        policy = policy if policy is not None else self.policy
+        start = time.perf_counter() if self.telemetry else None
+        (data, retries) = nocrw.read_batch(batch, policy.args())
+        if start is not None and batch:
+            self._record(start, [((req[0], req[1]), "read_batch", req[3]) for req in batch])
+        self._retried(retries)
+        return data
 
     def write_bytes(self, trg_id, addr, bytes, burst=False):
-        return nocrw.write_bytes(trg_id[0], trg_id[1], addr, bytes, burst)
+        if NoCethernet.recorder is not None:
+            NoCethernet.recorder.record('w', trg_id, addr, len(bytes))
+        start = time.perf_counter() if self.telemetry else None
+        res = nocrw.write_bytes(trg_id[0], trg_id[1], addr, bytes, burst)
+        if start is not None:
+            self._record(start, [(trg_id, "write", len(bytes))], burst)
+        return res
 
     def send_bytes(self, trg_id, trg_ep, bytes):
-        return nocrw.send_bytes(self.tcu.version, trg_id[0], trg_id[1], trg_ep, bytes)
+        start = time.perf_counter() if self.telemetry else None
+        res = nocrw.send_bytes(self.tcu.version, trg_id[0], trg_id[1], trg_ep, bytes)
+        if start is not None:
+            self._record(start, [(trg_id, "send", len(bytes))])
+        return res
+
+    def send_bytes_vec(self, msgs):
+        """
+        Sends multiple messages at once. <msgs> is a list of (trg_id, trg_ep, bytes). The messages
+        are packed into as few UDP packets as possible.
+        """
+        start = time.perf_counter() if self.telemetry else None
+        res = nocrw.send_bytes_vec(self.tcu.version, [(trg_id[0], trg_id[1], trg_ep, bytes)
+                                                      for (trg_id, trg_ep, bytes) in msgs])
+        if start is not None and msgs:
+            self._record(start, [(trg_id, "send_vec", len(bytes)) for (trg_id, _, bytes) in msgs])
+        return res
 
     def receive_bytes(self, timeout_ns=1000_000_000):
-        return nocrw.receive_bytes(timeout_ns)
+        start = time.perf_counter() if self.telemetry else None
+        data = nocrw.receive_bytes(timeout_ns)
+        if start is not None:
+            self._record(start, [(None, "receive", len(data))])
+        return data
+
+    def receive_into(self, buf, offset=0, timeout_ns=1000_000_000):
+        """
+        Copies the payload of the next packet into the writable buffer <buf> at <offset>. Returns
+        the number of received bytes (0 on timeout) and the offsets in <buf> at which a message
+        starts within the received data.
+        """
+        start = time.perf_counter() if self.telemetry else None
+        (size, starts) = nocrw.receive_into(buf, offset, timeout_ns)
+        if size > 0 and start is not None:
+            self._record(start, [(None, "receive", size)])
+        return (size, starts)
 
 class NoCmonitor(threading.Thread):
-    regex_udp = r'\s+\d+:\s(\w+):(\w+)(\s+[\w:]+){10}\s(\d+)'
+    """
+    Watches the drop counter of the host's UDP socket for the FPGA (bound to <port>) in
+    /proc/net/udp every <interval> seconds. The number of drops since the socket has been created
+    and within the last interval are available via drops and interval_drops. Callbacks added via
+    add_callback are called with (interval_drops, drops) whenever new drops have been detected.
+    """
     check_udp_delay = 2.0
 
-    def __init__(self):
-        self.dropmap = {}
+    def __init__(self, port=1800, interval=None, start=True):
+        #local_address is given as hex IP and port
+        self.port_suffix = ":%04X" % port
+        self.interval = interval if interval is not None else self.check_udp_delay
+        self.drops = 0
+        self.interval_drops = 0
+        self.callbacks = []
+        self.lock = threading.Lock()
         super(NoCmonitor, self).__init__()
         self.daemon = True
-        self.start()
+        if start:
+            self.start()
+
+    def add_callback(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self.lock:
+            self.callbacks.remove(callback)
 
     def run(self):
         while True:
             self.checkdrops()
-            time.sleep(self.check_udp_delay)
+            time.sleep(self.interval)
+
+    def read_drops(self):
+        """
+        Returns the drop counter of our socket or None if there is no such socket
+        """
+        with open("/proc/net/udp", "r") as fh:
+            #skip the header
+            fh.readline()
+            for l in fh:
+                #columns: sl, local_address, rem_address, ..., drops (last)
+                if self.port_suffix not in l:
+                    continue
+                cols = l.split()
+                if cols[1].endswith(self.port_suffix):
+                    return int(cols[-1])
+        return None
 
     def checkdrops(self):
-        fh = open("/proc/net/udp", "r")
-        for l in fh:
-            m = re.match(self.regex_udp, l)
-            if not m:
-                continue
-            #TODO only check our connection
-            madr = "%s:%s" % (m.group(1), m.group(2))
-            drops = int(m.group(4))
-            if madr not in self.dropmap:
-                self.dropmap[madr] = 0
-            if drops > self.dropmap[madr]:
-                print("WARN: detected a UDP packet drop in /proc/net/udp:%s:%d" % (madr, drops))
-                #print l
-                self.dropmap[madr] = drops
-        fh.close()
+        """
+        Checks for new drops and returns the number of drops since the last check
+        """
+        drops = self.read_drops()
+        if drops is None:
+            return 0
+
+        with self.lock:
+            self.interval_drops = max(drops - self.drops, 0)
+            self.drops = drops
+            callbacks = list(self.callbacks)
+
+        if self.interval_drops > 0:
+            print("WARN: detected %d UDP packet drops in /proc/net/udp (%d in total)" % (self.interval_drops, drops))
+            for cb in callbacks:
+                cb(self.interval_drops, drops)
+        return self.interval_drops
 
 class NoCARQRegfile(object):
     REGADDR_ARQ_ENABLE            = 0x00
@@ -73,11 +357,15 @@ class NoCARQRegfile(object):
         self.nocid = nocid
 
     def read8b_nocarq(self, trg_id, addr):
+        if NoCethernet.recorder is not None:
+            NoCethernet.recorder.record('r', tuple(trg_id) + ('arq',), addr, 8)
         data = nocrw.read8b_nocarq(trg_id[0], trg_id[1], addr)
         return int.from_bytes(data[0:8], byteorder='little')
 
     def write8b_nocarq(self, trg_id, addr, word):
         assert isinstance(word, int), "word must be an integer"
+        if NoCethernet.recorder is not None:
+            NoCethernet.recorder.record('w', tuple(trg_id) + ('arq',), addr, 8)
         data = bytearray()
         data = word.to_bytes(8, byteorder='little')
         nocrw.write8b_nocarq(trg_id[0], trg_id[1], addr, bytes(data))
@@ -131,3 +419,268 @@ class NoCARQRegfile(object):
         rxf_full = (rx_status >> 3) & 0x1
         rxf_empty = (rx_status >> 4) & 0x1
         return (rxf_empty, rxf_full, rxf_state)
+
+class AIMDPacer(object):
+    """
+    Limits the number of datagrams per second for bulk transfers. The rate is adapted based on drop
+    signals: the drop counter of the host socket (via <monitor>, a NoCmonitor) and the drop counter
+    of the NoC ARQ interface of the target (see check()). Without drops, the rate is increased by
+    <increase> datagrams/s per check; on drops, it is multiplied by <decrease>.
+    """
+    #payload per datagram for burst transfers
+    DATAGRAM_DATA = (1472 // 18) * 16
+
+    def __init__(self, rate=2000, min_rate=100, max_rate=100_000, increase=500, decrease=0.5, monitor=None):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.monitor = monitor
+        self.losses = 0
+        #(time, rate) after each adaption
+        self.history = []
+        self._next_time = None
+        self._host_drops = monitor.read_drops() if monitor is not None else None
+        self._arq_drops = {}
+
+    def datagrams(self, size):
+        return (size + self.DATAGRAM_DATA - 1) // self.DATAGRAM_DATA
+
+    def wait(self, size):
+        """
+        Waits until <size> bytes may be sent according to the current rate
+        """
+        now = time.time()
+        if self._next_time is None or self._next_time < now:
+            self._next_time = now
+        elif self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time += self.datagrams(size) / self.rate
+
+    def check(self, arq=None):
+        """
+        Checks for drops since the last check at the host socket and at the NoC ARQ interface
+        <arq> (a NoCARQRegfile) and adapts the rate. Returns true if drops have been detected.
+        """
+        loss = False
+        #whether there was a previous value to compare with
+        known = False
+        if self.monitor is not None:
+            drops = self.monitor.read_drops()
+            if drops is not None and self._host_drops is not None:
+                known = True
+                loss |= drops > self._host_drops
+            self._host_drops = drops
+        if arq is not None:
+            drops = arq.get_arq_drop_packet_count()
+            last = self._arq_drops.get(arq.nocid)
+            if last is not None:
+                known = True
+                loss |= drops != last
+            self._arq_drops[arq.nocid] = drops
+
+        if not known:
+            return False
+        if loss:
+            self.losses += 1
+            self.rate = max(self.rate * self.decrease, self.min_rate)
+        else:
+            self.rate = min(self.rate + self.increase, self.max_rate)
+        self.history.append((time.time(), self.rate))
+        return loss
+
+class Message(object):
+    """
+    a message received by MessageReceiver. <header> and <data> are memoryviews into the receive
+    ring and stay valid until release() is called.
+    """
+    __slots__ = ['flags', 'rsize', 'sender', 'length', 'sep', 'rep', 'rlabel', 'label', 'header',
+                 'data', '_recv', '_slot']
+
+    #flags
+    REPLY = 1
+
+    def __init__(self, recv, slot, view, hdr_len):
+        other, self.sep, self.rep = struct.unpack_from('<IHH', view)
+        self.flags = other & 0x1
+        self.rsize = (other >> 1) & 0xF
+        #(chip, tile)
+        self.sender = ((other >> 13) & 0x3F, (other >> 5) & 0xFF)
+        self.length = other >> 19
+        if hdr_len == 32:
+            self.rlabel, self.label = struct.unpack_from('<QQ', view, 8)
+        else:
+            self.rlabel, self.label = (None, struct.unpack_from('<Q', view, 8)[0])
+        self.header = view[0:hdr_len]
+        self.data = view[hdr_len:hdr_len + self.length]
+        self._recv = recv
+        self._slot = slot
+
+    def release(self):
+        """
+        Hands the memory of the message back to the receiver. The message must not be used afterwards.
+        """
+        self.header.release()
+        self.data.release()
+        self._recv._put_slot(self._slot)
+
+    def __repr__(self):
+        return "Message[sender={}:{}, sep={}, rep={}, flags={}, label={:#x}, length={}]".format(
+            self.sender[0], self.sender[1], self.sep, self.rep, self.flags, self.label, self.length)
+
+class MessageReceiver(threading.Thread):
+    """
+    Receives messages in a background thread. The payload of the packets is copied into a
+    preallocated ring of <slots> buffers of <slot_size> bytes each. The messages in the packets are
+    parsed and put into a queue per sender tile (key="sender"), per sender EP (key="ep") or into a
+    single queue (key=None). The consumer has to call Message.release() when done with a message.
+    If all buffers are in use, the receiver stalls until messages are released. Messages that do not
+    fit into a slot (minus MAX_PACKET_DATA) can be dropped. The message boundaries follow from the
+    length in the message header; if a message is incomplete when the next one starts (because
+    packets have been lost), it is dropped and the parsing continues at the new message. Note that other NoC accesses have to wait
+    while the receiver waits for a packet, which takes at most <timeout_ns>. Example:
+
+        recv = MessageReceiver(fpga_inst.nocif, key="sender")
+        msg = recv.get((0, modids.MODID_PM0))
+        handle(msg.data)
+        msg.release()
+    """
+    #messages are transferred in units of 16 bytes
+    FLIT_SIZE = 16
+    #maximum data per packet: 1472 bytes of UDP payload with 18-byte NoC packets carrying 16 bytes
+    MAX_PACKET_DATA = (1472 // 18) * 16
+
+    def __init__(self, nocif, slots=256, slot_size=16384, key="sender", timeout_ns=1_000_000):
+        assert key in ["sender", "ep", None]
+        self.nocif = nocif
+        self.hdr_len = 16 if nocif.tcu.version == 0 else 32
+        self.slot_size = slot_size
+        self.key = key
+        self.timeout_ns = timeout_ns
+        self.ring = bytearray(slots * slot_size)
+        view = memoryview(self.ring)
+        self.slot_views = [view[i * slot_size:(i + 1) * slot_size] for i in range(slots)]
+        #number of unreleased messages per slot
+        self.refs = [0] * slots
+        self.free = queue.SimpleQueue()
+        for i in range(slots):
+            self.free.put(i)
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.received = 0
+        self.dropped = 0
+        self.stalls = 0
+        self._running = True
+        super(MessageReceiver, self).__init__()
+        self.daemon = True
+        self.start()
+
+    def queue(self, key):
+        """
+        Returns the queue for the given sender (chip, tile), sender EP or None, depending on <key>
+        """
+        with self.lock:
+            if key not in self.queues:
+                self.queues[key] = queue.SimpleQueue()
+            return self.queues[key]
+
+    def get(self, key=None, timeout=None):
+        """
+        Returns the next message from the given queue (see queue()) or raises queue.Empty
+        """
+        return self.queue(key).get(timeout=timeout)
+
+    def stop(self):
+        self._running = False
+        self.join()
+
+    def _get_slot(self):
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            self.stalls += 1
+            return self.free.get()
+
+    def _put_slot(self, slot):
+        with self.lock:
+            self.refs[slot] -= 1
+            if self.refs[slot] > 0:
+                return
+        self.free.put(slot)
+
+    def _parse(self, slot, pos, size):
+        """
+        Dispatches all complete messages in the given slot, starting at <pos>, and returns the
+        offset of the first incomplete message
+        """
+        view = self.slot_views[slot]
+        while pos + self.hdr_len <= size:
+            length = struct.unpack_from('<I', view, pos)[0] >> 19
+            total = self.hdr_len + (length + self.FLIT_SIZE - 1) // self.FLIT_SIZE * self.FLIT_SIZE
+            if pos + total > size:
+                break
+            with self.lock:
+                self.refs[slot] += 1
+            msg = Message(self, slot, view[pos:pos + total], self.hdr_len)
+            if self.key == "sender":
+                key = msg.sender
+            elif self.key == "ep":
+                key = msg.sep
+            else:
+                key = None
+            self.queue(key).put(msg)
+            self.received += 1
+            pos += total
+        return pos
+
+    def _next_slot(self):
+        slot = self._get_slot()
+        with self.lock:
+            #the receiver holds a reference while filling a slot
+            self.refs[slot] += 1
+        return slot
+
+    def run(self):
+        slot = self._next_slot()
+        #the slot contains received data in [pos, fill)
+        pos = 0
+        fill = 0
+        #remaining bytes of a dropped message
+        skip = 0
+        while self._running:
+            (size, starts) = self.nocif.receive_into(self.slot_views[slot], fill, self.timeout_ns)
+            if size == 0:
+                continue
+            fill += size
+            #parse up to each message start and realign there
+            for end in starts + [fill]:
+                if skip > 0:
+                    amount = min(skip, end - pos)
+                    pos += amount
+                    skip -= amount
+                pos = self._parse(slot, pos, end)
+                if end < fill and pos != end:
+                    #the previous message is incomplete; drop it unless it is dropped already
+                    if skip == 0:
+                        self.dropped += 1
+                    (pos, skip) = (end, 0)
+
+            #keep filling the slot as long as another packet fits into it
+            if self.slot_size - fill >= self.MAX_PACKET_DATA:
+                continue
+
+            #move an incomplete message to the beginning of the next slot
+            rest = fill - pos
+            if rest > self.slot_size - self.MAX_PACKET_DATA:
+                #the message does not fit into a slot; drop it
+                length = struct.unpack_from('<I', self.slot_views[slot], pos)[0] >> 19
+                skip = self.hdr_len + (length + self.FLIT_SIZE - 1) // self.FLIT_SIZE * self.FLIT_SIZE - rest
+                self.dropped += 1
+                rest = 0
+            next_slot = self._next_slot()
+            if rest > 0:
+                self.slot_views[next_slot][0:rest] = self.slot_views[slot][pos:fill]
+            self._put_slot(slot)
+            (slot, pos, fill) = (next_slot, 0, rest)
+        self._put_slot(slot)
@@ -3,8 +3,9 @@ from enum import Enum
 
 import noc
 import memory
-from tcu import TCUStatusReg, TCUExtReg, EP, LOG, TileDesc
-from fpga_utils import Progress
+from tcu import TCUStatusReg, TCUExtReg, EP, TileDesc
+from fpga_utils import Progress, FPGA_Error
+from tculog import TCULog
 
 class RocketConfigReg(Enum):
     ENABLE = 0
@@ -23,6 +24,8 @@ class PM():
     ROCKET_INT_COUNT = 2
     ROCKET_TRACEMEM_BASE = 0x00100000
     ROCKET_TRACEMEM_SIZE = 1024
+    #number of entries in the TCU log memory
+    TCU_LOG_SIZE = 65536
 
     def __init__(self, tcu, nocif, nocid, pm_num):
         self.tcu = tcu
@@ -51,11 +54,72 @@ class PM():
         r2 = self.mem[self.tcu.ep_addr(ep_id) + 16]
         return EP.from_regs([r0, r1, r2])
 
+    def tcu_get_all_eps(self):
+        """
+        Reads all EPs with a single bulk transfer and returns them as a list
+        """
+        regs = self.mem.read_words(self.tcu.eps_addr(), self.tcu.ep_count() * 3)
+        return [EP.from_regs(regs[i:i + 3]) for i in range(0, len(regs), 3)]
+
     def tcu_set_ep(self, ep_id, ep):
         self.mem[self.tcu.ep_addr(ep_id) + 0] = ep.regs[0]
         self.mem[self.tcu.ep_addr(ep_id) + 8] = ep.regs[1]
         self.mem[self.tcu.ep_addr(ep_id) + 16] = ep.regs[2]
 
+    def _ep_runs(self, eps):
+        #group the EPs into runs of contiguous EP ids
+        runs = []
+        for ep_id in sorted(eps):
+            if runs and runs[-1][0] + len(runs[-1][1]) == ep_id:
+                runs[-1][1].append(eps[ep_id])
+            else:
+                runs.append((ep_id, [eps[ep_id]]))
+        return runs
+
+    def tcu_set_eps(self, eps, verify=False):
+        """
+        Configures multiple EPs at once. <eps> is a dict of EP id to EP. The EPs are written as
+        bursts over contiguous EP ids. If <verify> is set, the EPs are read back afterwards.
+        """
+        for (first, run) in self._ep_runs(eps):
+            addr = self.tcu.ep_addr(first)
+            data = b''.join(reg.to_bytes(8, byteorder='little') for ep in run for reg in ep.regs)
+            #bursts have to start at a 16-byte boundary
+            if addr % 16 != 0:
+                self.mem.write_bytes(addr, data[:8], burst=False)
+                addr += 8
+                data = data[8:]
+            if data:
+                self.mem.write_bytes(addr, data, burst=True)
+
+        if verify:
+            self.tcu_verify_eps(eps)
+
+    def tcu_ep_read_reqs(self, eps):
+        """
+        Returns the read requests for nocif.read_batch to read back the given EPs
+        """
+        return [(self.nocid, self.mem.offset + self.tcu.ep_addr(first), len(run) * 3 * 8)
+                for (first, run) in self._ep_runs(eps)]
+
+    def tcu_verify_eps(self, eps, data=None):
+        """
+        Checks whether the given EPs are configured as expected. <data> are the results of the
+        requests from tcu_ep_read_reqs; if not given, the EPs are read first.
+        """
+        if data is None:
+            data = self.mem.nocif.read_batch(self.tcu_ep_read_reqs(eps))
+
+        mismatches = []
+        for ((first, run), run_data) in zip(self._ep_runs(eps), data):
+            for (i, ep) in enumerate(run):
+                regs = [int.from_bytes(run_data[off:off + 8], byteorder='little')
+                        for off in range(i * 24, i * 24 + 24, 8)]
+                if regs != ep.regs:
+                    mismatches.append("  EP%d: expected %s, got %s" % (first + i, ep, EP.from_regs(regs)))
+        if mismatches:
+            raise FPGA_Error("%s: EP verification failed:\n%s" % (self.name, "\n".join(mismatches)))
+
     def tcu_set_features(self, priv, vm, ctxsw):
         flags = ((ctxsw & 0x1) << 2) | ((vm & 0x1) << 1) | (priv & 0x1)
         #TCU version cannot be changed
@@ -97,28 +161,29 @@ class PM():
     def tcu_error_flit_count(self):
         return self.mem[self.tcu.status_reg_addr(TCUStatusReg.DROP_FLIT_COUNT)] >> 32
 
+    def tcu_read_log(self, all=False, log_count=None):
+        """
+        Reads the TCU log memory with bulk transfers. Returns a tuple (log_count, words) with the
+        number of log messages written by the TCU and the raw log memory as a list of 64-bit words
+        (lower and upper word of each log, in log-memory order). The number of log messages is read
+        from the TCU unless <all> is set or <log_count> is given.
+        """
+        if all:
+            log_count = self.TCU_LOG_SIZE
+        elif log_count is None:
+            log_count = self.mem[self.tcu.log_addr()]
+
+        #first log is at TCU_REGADDR_TCU_LOG+0x10
+        words = self.mem.read_words(self.tcu.log_addr() + 0x10, min(log_count, self.TCU_LOG_SIZE) * 2)
+        return (log_count, words)
+
     def tcu_print_log(self, filename, all=False):
         # open and truncate file first (reads below might fail)
         fh = open(filename, 'w')
 
-        if all:
-            log_count = 65536
-        else:
-            log_count = self.mem[self.tcu.log_addr()]
-
+        (log_count, words) = self.tcu_read_log(all)
         print("%s: Number of TCU log messages: %d" % (self.name, log_count))
-        if log_count > 65536:
-            fh.write("%s: Number of TCU log messages: %d (only 65536 shown, last log at %d)\n" % (self.name, log_count, log_count%65536-1))
-            log_count = 65536
-        else:
-            fh.write("%s: Number of TCU log messages: %d\n" % (self.name, log_count))
-
-        #read log mem: first log is at TCU_REGADDR_TCU_LOG+0x10
-        if log_count > 0:
-            for i in range(log_count):
-                lower = self.mem[self.tcu.log_addr() + 0x10 + i * 16]
-                upper = self.mem[self.tcu.log_addr() + 0x18 + i * 16]
-                fh.write("%5d: %s\n" % (i, LOG.split_tcu_log(self.tcu.version, upper, lower)))
+        TCULog(self.tcu.version, self.nocid[1], log_count, words).write_text(fh)
         fh.close()
 
     def tcu_set_log_mask(self, mask):
@@ -189,6 +254,40 @@ class PM():
     def rocket_disableTrace(self):
         self.mem[self.tcu.config_reg_addr(RocketConfigReg.TRACE_ENABLE)] = 0
 
+    def rocket_readTrace(self, all=False):
+        """
+        Reads the traces in the order they have been written. Returns the raw trace records as list
+        of 64-bit words, four words per trace (see rocket_trace.decode).
+        """
+        #read trace count
+        trace_count = self.mem[self.tcu.config_reg_addr(RocketConfigReg.TRACE_COUNT)]
+        if all:
+            trace_count = self.ROCKET_TRACEMEM_SIZE
+        if trace_count == 0:
+            return []
+
+        #read current idx to calculate address of first trace
+        trace_current_idx = self.mem[self.tcu.config_reg_addr(RocketConfigReg.TRACE_IDX)]
+        if trace_current_idx >= trace_count:
+            trace_start_idx = trace_current_idx - trace_count
+        else:
+            trace_start_idx = self.ROCKET_TRACEMEM_SIZE + trace_current_idx - trace_count
+        trace_start_addr = self.ROCKET_TRACEMEM_BASE + 32*trace_start_idx
+
+        tmp_count = trace_count
+        #reduce tmp_count if traces wrap around
+        if (trace_start_idx+trace_count) > self.ROCKET_TRACEMEM_SIZE:
+            tmp_count = self.ROCKET_TRACEMEM_SIZE - trace_start_idx
+
+        #read traces, one trace occupies 32 byte
+        trace_data = self.mem.read_words(trace_start_addr, tmp_count*4)
+
+        #read the rest from start of trace memory
+        if tmp_count < trace_count:
+            trace_data_rest = self.mem.read_words(self.ROCKET_TRACEMEM_BASE, (trace_count-tmp_count)*4)
+            trace_data.extend(trace_data_rest)
+        return trace_data
+
     def rocket_printTrace(self, filename, all=False):
         #make sure trace is stopped before reading it
         self.rocket_disableTrace()
@@ -196,48 +295,12 @@ class PM():
         #open file first (reads below might fail)
         fh = open(filename, 'w')
 
-        #read trace count
-        trace_count = self.mem[self.tcu.config_reg_addr(RocketConfigReg.TRACE_COUNT)]
-        if all:
-            trace_count = self.ROCKET_TRACEMEM_SIZE
-
-        print("%s: Number of Rocket instruction traces: %d" % (self.name, trace_count))
-        fh.write("%s: Number of Rocket instruction traces: %d\n" % (self.name, trace_count))
+        #imported here, because rocket_trace imports this module
+        import rocket_trace
+        traces = rocket_trace.decode(self.rocket_readTrace(all))
 
-        if trace_count > 0:
-            fh.write("columns: addr opcode priv.-level exception interrupt cause tval\n")
-
-            #read current idx to calculate address of first trace
-            trace_current_idx = self.mem[self.tcu.config_reg_addr(RocketConfigReg.TRACE_IDX)]
-            if trace_current_idx >= trace_count:
-                trace_start_idx = trace_current_idx - trace_count
-            else:
-                trace_start_idx = self.ROCKET_TRACEMEM_SIZE + trace_current_idx - trace_count
-            trace_start_addr = self.ROCKET_TRACEMEM_BASE + 32*trace_start_idx
-
-            tmp_count = trace_count
-            #reduce tmp_count if traces wrap around
-            if (trace_start_idx+trace_count) > self.ROCKET_TRACEMEM_SIZE:
-                tmp_count = self.ROCKET_TRACEMEM_SIZE - trace_start_idx
-
-            #read traces, one trace occupies 32 byte
-            trace_data = self.mem.read_words(trace_start_addr, tmp_count*4)
-
-            #read the rest from start of trace memory
-            if tmp_count < trace_count:
-                trace_data_rest = self.mem.read_words(self.ROCKET_TRACEMEM_BASE, (trace_count-tmp_count)*4)
-                trace_data.extend(trace_data_rest)
-
-            #print to file
-            for i in range(0, trace_count*4, 4):
-                trace_addr = trace_data[i] & 0xFFFFFFFF
-                trace_opcode = trace_data[i] >> 32
-                trace_priv = trace_data[i+1] & 0x7
-                trace_except = (trace_data[i+1] >> 3) & 0x1
-                trace_int = (trace_data[i+1] >> 4) & 0x1
-                trace_cause = ((trace_data[i+2] & 0x1F) << 59) |  (trace_data[i+1] >> 5)
-                trace_tval = trace_data[i+2] >> 5
-                fh.write("{:4d}: {:#010x} {:#010x} {:d} {:d} {:d} {:#018x} {:#010x}\n".format(i>>2, trace_addr, trace_opcode, trace_priv, trace_except, trace_int, trace_cause, trace_tval))
+        print("%s: Number of Rocket instruction traces: %d" % (self.name, len(traces)))
+        rocket_trace.write_text(fh, traces, self.name)
 
         fh.close()
 
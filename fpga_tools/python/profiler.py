@@ -0,0 +1,208 @@
+"""
+this module provides a sampling profiler for the Rocket cores based on the instruction trace
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+import numpy as np
+from elftools.elf.elffile import ELFFile
+
+import rocket_trace
+from pm import RocketConfigReg
+
+
+class Symbolizer():
+    """
+    maps addresses to the functions of an ELF binary. The function symbols are kept in a sorted
+    index, so that a lookup is a binary search, and the result is cached per address.
+    """
+    #the trace only contains the lower 32 bits of the address
+    ADDR_MASK = 0xFFFFFFFF
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.name = os.path.basename(filename)
+        syms = []
+        with open(filename, 'rb') as f:
+            elf = ELFFile(f)
+            symtab = elf.get_section_by_name('.symtab')
+            assert symtab is not None, "%s has no symbol table" % filename
+            for sym in symtab.iter_symbols():
+                if sym['st_info']['type'] == 'STT_FUNC' and sym['st_value'] != 0:
+                    syms.append((sym['st_value'] & self.ADDR_MASK, sym['st_size'], sym.name))
+        syms.sort()
+
+        self.starts = [s[0] for s in syms]
+        self.names = [s[2] for s in syms]
+        #functions without size extend to the next symbol
+        self.ends = []
+        for (i, (start, size, _)) in enumerate(syms):
+            if size > 0:
+                self.ends.append(start + size)
+            else:
+                self.ends.append(syms[i + 1][0] if i + 1 < len(syms) else start + 1)
+        self.cache = {}
+
+    def lookup(self, addr):
+        """
+        Returns the name of the function that contains <addr> or None
+        """
+        if addr not in self.cache:
+            i = bisect_right(self.starts, addr) - 1
+            self.cache[addr] = self.names[i] if i >= 0 and addr < self.ends[i] else None
+        return self.cache[addr]
+
+
+#symbolizers per binary, reloaded if the binary changes
+_symbolizers = {}
+
+def symbolizer(filename):
+    path = os.path.realpath(filename)
+    key = (path, os.stat(path).st_mtime)
+    if key not in _symbolizers:
+        _symbolizers[key] = Symbolizer(path)
+    return _symbolizers[key]
+
+
+class Profiler(threading.Thread):
+    """
+    Samples the program counters of one or more Rocket cores. In every interval, the trace ring of
+    each core is read (at most <depth> records written since the last sample), so that the
+    histogram counts executed instructions in short windows spread over the run. Example:
+
+        prof = Profiler(fpga_inst.pms[:2], {fpga_inst.pms[0]: ["kernel", "app"]})
+        prof.start()
+        ...
+        prof.stop()
+        prof.print_flat()
+        prof.write_collapsed("prof.folded")
+
+    The trace does not contain call stacks, so that the collapsed stacks consist of tile, binary and
+    function only.
+    """
+    UNKNOWN = "[unknown]"
+
+    def __init__(self, pms, binaries=None, interval=0.01, depth=256):
+        self.pms = pms
+        binaries = binaries or {}
+        self.symbolizers = {pm: [symbolizer(f) for f in binaries.get(pm, [])] for pm in pms}
+        self.interval = interval
+        self.depth = depth
+        #histogram of addresses per PM
+        self.hist = {pm: Counter() for pm in pms}
+        self.samples = 0
+        self.error = None
+        self._running = True
+        self._last_idx = {}
+        super(Profiler, self).__init__()
+        self.daemon = True
+
+    def start(self):
+        for pm in self.pms:
+            pm.rocket_enableTrace()
+        super(Profiler, self).start()
+
+    def stop(self):
+        self._running = False
+        self.join()
+        for pm in self.pms:
+            pm.rocket_disableTrace()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        while self._running:
+            try:
+                self.sample()
+            except Exception as e:
+                self.error = e
+                return
+            time.sleep(self.interval)
+
+    def sample(self):
+        """
+        Takes one sample of all cores
+        """
+        nocif = self.pms[0].mem.nocif
+        reg = self.pms[0].tcu.config_reg_addr(RocketConfigReg.TRACE_IDX)
+        idxs = nocif.read_batch([(pm.nocid, reg, 8) for pm in self.pms])
+
+        reqs = []
+        owners = []
+        for (pm, data) in zip(self.pms, idxs):
+            idx = int.from_bytes(data, byteorder='little')
+            last = self._last_idx.get(pm)
+            self._last_idx[pm] = idx
+            if last is None:
+                continue
+            count = min((idx - last) % pm.ROCKET_TRACEMEM_SIZE, self.depth)
+            if count == 0:
+                continue
+
+            #read the <count> records before idx, which requires two reads if the ring wraps
+            start = (idx - count) % pm.ROCKET_TRACEMEM_SIZE
+            first = min(count, pm.ROCKET_TRACEMEM_SIZE - start)
+            reqs.append((pm.nocid, pm.ROCKET_TRACEMEM_BASE + start * 32, first * 32))
+            owners.append(pm)
+            if first < count:
+                reqs.append((pm.nocid, pm.ROCKET_TRACEMEM_BASE, (count - first) * 32))
+                owners.append(pm)
+
+        if not reqs:
+            return
+        for (pm, data) in zip(owners, nocif.read_batch(reqs)):
+            (addrs, counts) = np.unique(rocket_trace.decode(data)['addr'], return_counts=True)
+            self.hist[pm].update(dict(zip(addrs.tolist(), counts.tolist())))
+            self.samples += int(counts.sum())
+
+    def symbolize(self, pm, addr):
+        """
+        Returns (binary, function) for the given address on the given PM
+        """
+        for sym in self.symbolizers[pm]:
+            name = sym.lookup(addr)
+            if name is not None:
+                return (sym.name, name)
+        return (self.UNKNOWN, self.UNKNOWN)
+
+    def _functions(self):
+        funcs = defaultdict(Counter)
+        for pm in self.pms:
+            for (addr, count) in self.hist[pm].items():
+                funcs[pm][self.symbolize(pm, addr)] += count
+        return funcs
+
+    def flat_profile(self, per_tile=False):
+        """
+        Returns a list of (tile, binary, function, samples, percent) sorted by samples. The tile is
+        None unless <per_tile> is set.
+        """
+        total = Counter()
+        for (pm, funcs) in self._functions().items():
+            for ((binary, func), count) in funcs.items():
+                total[(pm.name if per_tile else None, binary, func)] += count
+
+        rows = []
+        for ((tile, binary, func), count) in total.most_common():
+            rows.append((tile, binary, func, count, 100.0 * count / self.samples))
+        return rows
+
+    def print_flat(self, per_tile=False, limit=None, fh=sys.stdout):
+        fh.write("%d samples\n" % self.samples)
+        fh.write("{:>7} {:>10}  {}\n".format("%", "samples", "function"))
+        for (tile, binary, func, count, percent) in self.flat_profile(per_tile)[:limit]:
+            name = "%s`%s" % (binary, func) if tile is None else "%s:%s`%s" % (tile, binary, func)
+            fh.write("{:>6.2f}% {:>10}  {}\n".format(percent, count, name))
+
+    def write_collapsed(self, filename):
+        """
+        Writes the profile in the collapsed-stack format for flame graphs (e.g., flamegraph.pl)
+        """
+        with open(filename, 'w') as fh:
+            for (pm, funcs) in self._functions().items():
+                for ((binary, func), count) in sorted(funcs.items()):
+                    fh.write("%s;%s;%s %d\n" % (pm.name, binary, func, count))
@@ -0,0 +1,260 @@
+"""
+this module streams the instruction trace of Rocket cores to a file while tracing stays enabled and
+decodes traces with NumPy
+"""
+import struct
+import threading
+import time
+
+import numpy as np
+
+from pm import RocketConfigReg
+
+#decoded trace record (see PM.rocket_printTrace for the layout of the raw records)
+TRACE_DTYPE = np.dtype([
+    ('addr', '<u4'),
+    ('opcode', '<u4'),
+    ('priv', 'u1'),
+    ('exception', 'u1'),
+    ('interrupt', 'u1'),
+    ('cause', '<u8'),
+    ('tval', '<u8'),
+])
+
+TRACE_FILE_MAGIC = b'RTRD'
+TRACE_FILE_VERSION = 1
+TRACE_FILE_HEADER = struct.Struct('<4sHHQ')
+
+
+def decode(raw):
+    """
+    Decodes raw trace records into a structured array of TRACE_DTYPE. <raw> is either the list of
+    64-bit words as returned by PM.rocket_readTrace or the bytes of the records.
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        words = np.frombuffer(raw, dtype='<u8')
+    else:
+        words = np.asarray(raw, dtype=np.uint64)
+    #one trace record occupies four words, the last one is unused
+    words = words.reshape(-1, 4)
+    w0 = words[:, 0]
+    w1 = words[:, 1]
+    w2 = words[:, 2]
+
+    traces = np.empty(len(words), dtype=TRACE_DTYPE)
+    traces['addr'] = w0 & 0xFFFFFFFF
+    traces['opcode'] = w0 >> np.uint64(32)
+    traces['priv'] = w1 & 0x7
+    traces['exception'] = (w1 >> np.uint64(3)) & 0x1
+    traces['interrupt'] = (w1 >> np.uint64(4)) & 0x1
+    traces['cause'] = ((w2 & 0x1F) << np.uint64(59)) | (w1 >> np.uint64(5))
+    traces['tval'] = w2 >> np.uint64(5)
+    return traces
+
+
+def save(filename, traces):
+    """
+    Stores decoded traces in a compact binary file
+    """
+    with open(filename, 'wb') as fh:
+        fh.write(TRACE_FILE_HEADER.pack(TRACE_FILE_MAGIC, TRACE_FILE_VERSION, TRACE_DTYPE.itemsize, len(traces)))
+        fh.write(traces.astype(TRACE_DTYPE, copy=False).tobytes())
+
+
+def load(filename):
+    """
+    Loads traces that have been stored with save()
+    """
+    with open(filename, 'rb') as fh:
+        (magic, version, size, count) = TRACE_FILE_HEADER.unpack(fh.read(TRACE_FILE_HEADER.size))
+        assert magic == TRACE_FILE_MAGIC, "%s is no trace file" % filename
+        assert version == TRACE_FILE_VERSION and size == TRACE_DTYPE.itemsize, \
+            "%s has unsupported format version %d" % (filename, version)
+        return np.fromfile(fh, dtype=TRACE_DTYPE, count=count)
+
+
+def load_stream(filename):
+    """
+    Loads and decodes a file written by TraceCollector. Returns the traces and a list of
+    (host time, total number of lost records, index of the first trace) for each chunk.
+    """
+    with open(filename, 'rb') as fh:
+        data = fh.read()
+    (magic, _, rec_size) = TraceCollector.FILE_HEADER.unpack_from(data)
+    assert magic == TraceCollector.FILE_MAGIC, "%s is no trace stream" % filename
+
+    parts = []
+    chunks = []
+    first = 0
+    pos = TraceCollector.FILE_HEADER.size
+    while pos < len(data):
+        (host_time, lost, count) = TraceCollector.CHUNK_HEADER.unpack_from(data, pos)
+        pos += TraceCollector.CHUNK_HEADER.size
+        parts.append(data[pos:pos + count * rec_size])
+        chunks.append((host_time, lost, first))
+        pos += count * rec_size
+        first += count
+    return (decode(b''.join(parts)), chunks)
+
+
+def format_lines(traces, start=0):
+    """
+    Renders the given traces as text lines in the format of PM.rocket_printTrace. <start> is the
+    number of the first trace.
+    """
+    for (i, t) in enumerate(traces.tolist(), start):
+        yield "{:4d}: {:#010x} {:#010x} {:d} {:d} {:d} {:#018x} {:#010x}\n".format(i, *t)
+
+
+def write_text(fh, traces, name):
+    """
+    Writes the traces to the given file handle like PM.rocket_printTrace for tile <name>
+    """
+    fh.write("%s: Number of Rocket instruction traces: %d\n" % (name, len(traces)))
+    if len(traces) > 0:
+        fh.write("columns: addr opcode priv.-level exception interrupt cause tval\n")
+        fh.writelines(format_lines(traces))
+
+
+class TraceCollector(threading.Thread):
+    """
+    Continuously drains the trace ring of a Rocket core (see PM.rocket_printTrace) into a binary
+    file, so that the instruction history is not limited to the size of the ring. Example:
+
+        coll = TraceCollector(fpga_inst.pms[0], "pm0.trace")
+        coll.start()
+        ...
+        coll.stop()
+
+    The hardware only provides the current write index (TRACE_IDX) and the number of traces, which
+    saturates at the ring size (TRACE_COUNT). Thus, the collector cannot tell how often the ring has
+    been overwritten between two polls. Instead, it keeps the last drained record and compares it
+    with the ring contents on the next poll: if the record has been overwritten, the whole ring is
+    drained and the records written since the last poll are counted as lost. The number of lost
+    records is therefore a lower bound (a loop that writes the same record again is not detected).
+    Records that the core overwrites while they are being read are dropped and counted as lost, too.
+
+    The file starts with FILE_HEADER, followed by chunks that consist of CHUNK_HEADER (host time,
+    total number of records lost so far, number of records) and the raw 32-byte records.
+    """
+    FILE_MAGIC = b'RTRC'
+    FILE_VERSION = 1
+    FILE_HEADER = struct.Struct('<4sHH')
+    CHUNK_HEADER = struct.Struct('<dII')
+    RECORD_SIZE = 32
+
+    def __init__(self, pm, filename, interval=0.001):
+        self.pm = pm
+        self.filename = filename
+        self.interval = interval
+        self.ring_size = pm.ROCKET_TRACEMEM_SIZE
+        self.records = 0
+        self.lost = 0
+        self.overruns = 0
+        self.error = None
+        self._running = True
+        self._last_idx = None
+        self._last_count = 0
+        self._last_record = None
+        self._fh = None
+        super(TraceCollector, self).__init__()
+        self.daemon = True
+
+    def start(self):
+        self._fh = open(self.filename, 'wb')
+        self._fh.write(self.FILE_HEADER.pack(self.FILE_MAGIC, self.FILE_VERSION, self.RECORD_SIZE))
+        #start at the current position; records written before are not collected
+        (self._last_idx, self._last_count) = self._read_regs()
+        self.pm.rocket_enableTrace()
+        super(TraceCollector, self).start()
+
+    def stop(self):
+        """
+        Disables tracing, drains the remaining records and closes the file
+        """
+        self._running = False
+        self.join()
+        self.pm.rocket_disableTrace()
+        try:
+            if self.error is None:
+                self.poll()
+        finally:
+            self._fh.close()
+        if self.error is not None:
+            raise self.error
+        print("%s: %d Rocket instruction traces collected, at least %d lost (%d overruns)" % (
+            self.pm.name, self.records, self.lost, self.overruns))
+
+    def run(self):
+        while self._running:
+            try:
+                self.poll()
+            except Exception as e:
+                self.error = e
+                return
+            time.sleep(self.interval)
+
+    def _read_regs(self):
+        #TRACE_IDX and TRACE_COUNT are adjacent
+        return self.pm.mem.read_words(self.pm.tcu.config_reg_addr(RocketConfigReg.TRACE_IDX), 2)
+
+    def _read_ring(self, start, count):
+        start %= self.ring_size
+        first = min(count, self.ring_size - start)
+        data = self.pm.mem.read_bytes(self.pm.ROCKET_TRACEMEM_BASE + start * self.RECORD_SIZE,
+                                      first * self.RECORD_SIZE)
+        if first < count:
+            data += self.pm.mem.read_bytes(self.pm.ROCKET_TRACEMEM_BASE, (count - first) * self.RECORD_SIZE)
+        return data
+
+    def _written_since(self, idx):
+        return (self._read_regs()[0] - idx) % self.ring_size
+
+    def poll(self):
+        """
+        Drains the records that have been written since the last poll
+        """
+        (idx, count) = self._read_regs()
+        new = (idx - self._last_idx) % self.ring_size
+
+        #the count saturated although the index did not advance far enough: the ring has wrapped
+        overrun = count >= self.ring_size and new < self.ring_size - min(self._last_count, self.ring_size)
+        #otherwise, read the last drained record as well to detect whether the ring has been overwritten
+        check = 1 if self._last_record is not None and not overrun else 0
+        written = 0
+        if not overrun and new + check > 0:
+            data = self._read_ring(idx - new - check, new + check)
+            #the core keeps writing during the read, which might overwrite the oldest records
+            written = self._written_since(idx)
+            if check and written < self.ring_size - new and data[:self.RECORD_SIZE] != self._last_record:
+                overrun = True
+            data = data[check * self.RECORD_SIZE:]
+
+        if overrun:
+            #at least the records since the last poll have been overwritten; take the whole ring
+            self.overruns += 1
+            self.lost += new
+            idx = (idx + written) % self.ring_size
+            new = self.ring_size
+            data = self._read_ring(idx, new)
+            written = self._written_since(idx)
+
+        self._last_idx = idx
+        self._last_count = count
+        if new == 0:
+            return
+
+        #drop the records that might have been overwritten during the read
+        stale = max(written - (self.ring_size - new), 0)
+        if stale > 0:
+            self.lost += stale
+            new -= stale
+            data = data[stale * self.RECORD_SIZE:]
+            if new == 0:
+                self._last_record = None
+                return
+
+        self._last_record = data[-self.RECORD_SIZE:]
+        self._fh.write(self.CHUNK_HEADER.pack(time.time(), self.lost, new))
+        self._fh.write(data)
+        self.records += new
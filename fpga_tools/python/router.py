@@ -33,6 +33,35 @@ class Router(memory.Memory):
         else:
             return 0
 
+    def router_position(router_num):
+        """
+        Returns the (x, y) coordinate of the given router in the mesh (y grows to the south)
+        """
+        modid = modids.MODID_ROUTER[router_num]
+        return ((modid >> 2) & 0x7, (modid >> 5) & 0x7)
+
+    def position(self):
+        return Router.router_position(self.router_num)
+
+    def link_directions(self):
+        """
+        Returns a dict of inter-router link to direction ('N', 'E', 'S' or 'W')
+        """
+        (x, y) = self.position()
+        dirs = []
+        for (dir, (nx, ny)) in [('N', (x, y - 1)), ('E', (x + 1, y)), ('S', (x, y + 1)), ('W', (x - 1, y))]:
+            if any(Router.router_position(r) == (nx, ny) for r in range(self.ROUTER_CNT)):
+                dirs.append(dir)
+        return {3 + i: dir for (i, dir) in enumerate(dirs)}
+
+    def flit_count_reqs(self, reset=0):
+        """
+        Returns the read requests for nocif.read_batch to read the flit counters of all links
+        """
+        cmd = 0x3 if reset == 0 else 0x4
+        return [(self.nocid, self.mem.offset + ((cmd<<28) | ((link+8)<<24)), 8)
+                for link in range(self.ROUTER_LINKCNT[self.router_num][1])]
+
     def getFlitCount(self, reset=0):
         flitCnt = []
         for link in range(self.ROUTER_LINKCNT[self.router_num][1]):
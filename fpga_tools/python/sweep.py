@@ -0,0 +1,175 @@
+"""
+this module runs a workload with a grid of emulated chiplet interface delays on all PMs in parallel
+"""
+import csv
+import itertools
+import statistics
+import sys
+import time
+
+
+class DelaySweep():
+    """
+    Runs the workload <elf> once per combination of memory, MMIO and TCU cache delays (see
+    PM.rocket_setChipletMemDelay etc.) and repetition. Each delay list contains (read, write)
+    tuples. The runs are distributed over the given PMs, so that as many runs execute in parallel as
+    there are PMs. Example:
+
+        sweep = DelaySweep(fpga_inst.pms, "targets/bench", done_addr=0x10071000,
+                           result_addrs=[0x10071008], mem_delays=[(0, 0), (10, 10), (20, 20)],
+                           repeats=5)
+        sweep.run()
+        sweep.print_summary()
+        sweep.write_csv("sweep.csv")
+
+    Before each run, the word at <done_addr> is set to <init_value>. The workload signals its
+    completion by writing a different value to it; the words at <result_addrs> (e.g., a cycle
+    counter) are read afterwards. The runtime is measured by the host from the start of the core
+    until the completion is observed and therefore includes the polling latency.
+    """
+    AXES = ['mem', 'mmio', 'tcu']
+
+    def __init__(self, pms, elf, done_addr, result_addrs=(), mem_delays=((0, 0),),
+                 mmio_delays=((0, 0),), tcu_delays=((0, 0),), repeats=1, timeout=10.0, init_value=0):
+        self.pms = pms
+        self.elf = elf
+        self.done_addr = done_addr
+        self.result_addrs = list(result_addrs)
+        self.grid = list(itertools.product(mem_delays, mmio_delays, tcu_delays))
+        self.repeats = repeats
+        self.timeout = timeout
+        self.init_value = init_value
+        #list of dicts, one per run
+        self.runs = []
+
+    def _prepare(self, pm, config, repeat):
+        (mem_dly, mmio_dly, tcu_dly) = config
+        #start from the initial state
+        pm.stop()
+        pm.start()
+        pm.mem.write_elf(self.elf)
+        pm.mem[self.done_addr] = self.init_value
+        pm.rocket_setChipletMemDelay(*mem_dly)
+        pm.rocket_setChipletMmioDelay(*mmio_dly)
+        pm.rocket_setChipletTCUCacheDelay(*tcu_dly)
+        return {'config': config, 'repeat': repeat, 'pm': pm.name}
+
+    def _start(self, pm, run):
+        pm.rocket_start()
+        run['start'] = time.time()
+        return run
+
+    def _finish(self, pm, run, status, results=None):
+        pm.stop()
+        run['runtime'] = time.time() - run['start'] if status == "ok" else None
+        run['status'] = status
+        run['results'] = results if results is not None else [None] * len(self.result_addrs)
+        self.runs.append(run)
+        print("%s: %s run %d: %s %s" % (pm.name, DelaySweep.config_str(run['config']),
+                                       run['repeat'], status,
+                                       "" if run['runtime'] is None else "%.3fs" % run['runtime']))
+
+    def config_str(config):
+        return " ".join("%s=%d/%d" % (axis, dly[0], dly[1]) for (axis, dly) in zip(DelaySweep.AXES, config))
+
+    def run(self, poll_interval=0.01):
+        """
+        Executes all runs and returns the list of runs
+        """
+        pending = [(config, rep) for rep in range(self.repeats) for config in self.grid]
+        pending.reverse()
+        busy = {}
+        nocif = self.pms[0].mem.nocif
+
+        while pending or busy:
+            #load the next runs on all idle PMs first and start the cores afterwards, so that no
+            #ELF loading is included in the runtime of another run
+            ready = []
+            for pm in self.pms:
+                if pm not in busy and pending:
+                    ready.append((pm, self._prepare(pm, *pending.pop())))
+            for (pm, run) in ready:
+                busy[pm] = self._start(pm, run)
+
+            #poll the completion address of all busy PMs at once
+            active = list(busy.keys())
+            words = nocif.read_batch([(pm.nocid, pm.mem.offset + self.done_addr, 8) for pm in active])
+            done = [pm for (pm, w) in zip(active, words)
+                    if int.from_bytes(w, byteorder='little') != self.init_value]
+            if done and self.result_addrs:
+                reqs = [(pm.nocid, pm.mem.offset + a, 8) for pm in done for a in self.result_addrs]
+                res = [int.from_bytes(w, byteorder='little') for w in nocif.read_batch(reqs)]
+            for (i, pm) in enumerate(done):
+                n = len(self.result_addrs)
+                self._finish(pm, busy.pop(pm), "ok", res[i * n:(i + 1) * n] if n else [])
+
+            now = time.time()
+            for pm in [pm for pm in busy if now - busy[pm]['start'] > self.timeout]:
+                self._finish(pm, busy.pop(pm), "timeout")
+
+            if busy:
+                time.sleep(poll_interval)
+        return self.runs
+
+    def summary(self):
+        """
+        Returns a list of dicts with the statistics of runtime and results over the repetitions of
+        each configuration
+        """
+        rows = []
+        for config in self.grid:
+            runs = [r for r in self.runs if r['config'] == config]
+            ok = [r for r in runs if r['status'] == "ok"]
+            row = {'config': config, 'runs': len(runs), 'failed': len(runs) - len(ok)}
+            series = [('runtime', [r['runtime'] for r in ok])]
+            for (i, addr) in enumerate(self.result_addrs):
+                series.append(("%#x" % addr, [r['results'][i] for r in ok]))
+            for (name, vals) in series:
+                row[name + '_mean'] = statistics.mean(vals) if vals else None
+                row[name + '_stdev'] = statistics.stdev(vals) if len(vals) > 1 else None
+                row[name + '_min'] = min(vals) if vals else None
+                row[name + '_max'] = max(vals) if vals else None
+            rows.append(row)
+        return rows
+
+    def _columns(self, with_runs):
+        cols = []
+        for axis in self.AXES:
+            cols += [axis + '_rd', axis + '_wr']
+        if with_runs:
+            return cols + ['repeat', 'pm', 'status', 'runtime'] + ["%#x" % a for a in self.result_addrs]
+        cols += ['runs', 'failed']
+        for name in ['runtime'] + ["%#x" % a for a in self.result_addrs]:
+            cols += [name + '_mean', name + '_stdev', name + '_min', name + '_max']
+        return cols
+
+    def _flatten(self, row, with_runs):
+        flat = {}
+        for (axis, (rd, wr)) in zip(self.AXES, row['config']):
+            flat[axis + '_rd'] = rd
+            flat[axis + '_wr'] = wr
+        flat.update({k: v for (k, v) in row.items() if k not in ['config', 'results', 'start']})
+        if with_runs:
+            flat.update({"%#x" % a: v for (a, v) in zip(self.result_addrs, row['results'])})
+        return flat
+
+    def write_csv(self, filename, with_runs=False):
+        """
+        Writes the summary (or every single run, if <with_runs> is set) as CSV file
+        """
+        cols = self._columns(with_runs)
+        rows = self.runs if with_runs else self.summary()
+        with open(filename, 'w', newline='') as fh:
+            writer = csv.DictWriter(fh, fieldnames=cols)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(self._flatten(row, with_runs))
+
+    def print_summary(self, fh=sys.stdout):
+        cols = self._columns(False)
+        fh.write(" ".join("{:>14}".format(c) for c in cols) + "\n")
+        for row in self.summary():
+            flat = self._flatten(row, False)
+            vals = ["-" if flat[c] is None else flat[c] for c in cols]
+            vals = ["{:.4g}".format(v) if isinstance(v, float) else v for v in vals]
+            fh.write(" ".join("{:>14}".format(v) for v in vals) + "\n")
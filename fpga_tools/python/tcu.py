@@ -31,6 +31,9 @@ class EP():
     RECEIVE = 2
     MEMORY = 3
 
+    #bit masks of the registers that are changed by the TCU at runtime, per kind of change
+    DYNAMIC = {}
+
     def invalid():
         return EP([0, 0, 0])
 
@@ -44,6 +47,32 @@ class EP():
             return MemEP(regs)
         return ep
 
+    def diff(old_eps, new_eps):
+        """
+        Compares two lists of EPs (e.g., from PM.tcu_get_all_eps) and returns a list of
+        (ep_id, kinds, old_ep, new_ep) for all EPs that differ. <kinds> contains "config" if the EP
+        has been reconfigured, "credits" if the credits of a send EP and "ring" if the read/write
+        position or the unread/occupied slots of a receive EP changed.
+        """
+        changes = []
+        for (ep_id, (old, new)) in enumerate(zip(old_eps, new_eps)):
+            if old.regs == new.regs:
+                continue
+            if old.type() != new.type():
+                changes.append((ep_id, ["config"], old, new))
+                continue
+
+            kinds = []
+            static = [~0, ~0, ~0]
+            for (kind, masks) in sorted(new.DYNAMIC.items()):
+                if any((o ^ n) & m for (o, n, m) in zip(old.regs, new.regs, masks)):
+                    kinds.append(kind)
+                static = [s & ~m for (s, m) in zip(static, masks)]
+            if any((o ^ n) & m for (o, n, m) in zip(old.regs, new.regs, static)):
+                kinds.insert(0, "config")
+            changes.append((ep_id, kinds, old, new))
+        return changes
+
     def __init__(self, regs):
         self.regs = regs
 
@@ -60,8 +89,8 @@ class EP():
         return "Inv [type={}, act={}]".format(self.type(), self.act())
 
 class MemEP(EP):
-    def __init__(self, regs = [EP.MEMORY, 0, 0]):
-        super(MemEP, self).__init__(regs)
+    def __init__(self, regs = None):
+        super(MemEP, self).__init__(regs if regs is not None else [EP.MEMORY, 0, 0])
 
     def tile(self):
         return (self.regs[0] >> 23) & 0xFF
@@ -98,9 +127,10 @@ class MemEP(EP):
 
 class SendEP(EP):
     UNLIMITED_CRD = 0x3F
+    DYNAMIC = {"credits": [0x3F << 19, 0, 0]}
 
-    def __init__(self, regs = [EP.SEND, 0, 0]):
-        super(SendEP, self).__init__(regs)
+    def __init__(self, regs = None):
+        super(SendEP, self).__init__(regs if regs is not None else [EP.SEND, 0, 0])
 
     def tile(self):
         return (self.regs[1] >> 16) & 0xFF
@@ -153,8 +183,10 @@ class SendEP(EP):
         )
 
 class RecvEP(EP):
-    def __init__(self, regs = [EP.RECEIVE, 0, 0]):
-        super(RecvEP, self).__init__(regs)
+    DYNAMIC = {"ring": [(0x3F << 47) | (0x3F << 53), 0, 0xFFFF_FFFF_FFFF_FFFF]}
+
+    def __init__(self, regs = None):
+        super(RecvEP, self).__init__(regs if regs is not None else [EP.RECEIVE, 0, 0])
 
     def buffer(self):
         return self.regs[1]
@@ -280,206 +312,218 @@ class LOG():
               "PRIV_TIMER_INTR",
               "PMP_ACCESS_DENIED"]
 
-    def split_tcu_log(version, upper_data64, lower_data64):
-        tcu_log = LOG()
+    #text representation of the fields of each log id (see decode_tcu_log)
+    LOG_FORMAT = {
+        "CMD_SEND": "to tile: {modid}, ep: {ep:d}, local addr: {addr:#010x}, size: {size:d}",
+        "CMD_REPLY": "to tile: {modid}, ep: {ep:d}, local addr: {addr:#010x}, msg offset: {offset:#x}, size: {size:d}",
+        "CMD_READ": "to tile: {modid}, ep: {ep:d}, local addr: {addr:#010x}, rem. addr offset: {offset:#x}, size: {size:d}",
+        "CMD_WRITE": "to tile: {modid}, ep: {ep:d}, local addr: {addr:#010x}, rem. addr offset: {offset:#x}, size: {size:d}",
+        "CMD_FETCH": "ep: {ep:d}, msg offset: {offset:#x}",
+        "CMD_ACK_MSG": "ep: {ep:d}, msg offset: {offset:#x}",
+        "CMD_FINISH": "error: {error}",
+        "RECV_FINISH": "orig. occ. mask: {occ_mask:#010x}, orig. unread mask: {unread_mask:#010x}, new set bit pos. in masks: {bitpos:#010x}",
+        "CMD_EXT_INVEP": "ep: {ep:d}, force: {force:d}",
+        "CMD_EXT_FINISH": "error: {error}",
+        "NOC_REG_WRITE_ERR": "from tile: {modid}, mode: {mode:d}, local addr: {addr:#010x}",
+        "NOC_REG_WRITE": "from tile: {modid}, mode: {mode:d}, local addr: {addr:#010x}",
+        "NOC_READ_RSP": "from tile: {modid}, mode: {mode:d}, local addr: {addr:#010x}",
+        "NOC_READ_RSP_ERR": "from tile: {modid}, mode: {mode:d}, local addr: {addr:#010x}",
+        "NOC_READ_RSP_DONE": "from tile: {modid}, error: {error}",
+        "NOC_WRITE": "from tile: {modid}, mode: {mode:d}, local addr: {addr:#010x}",
+        "NOC_READ_ERR": "from tile: {modid}, mode: {mode:d}, local addr: {addr:#010x} size: {size:d}",
+        "NOC_READ": "from tile: {modid}, mode: {mode:d}, local addr: {addr:#010x} size: {size:d}",
+        "NOC_MSG": "from tile: {modid}, recv-ep: {ep:d}",
+        "NOC_MSG_INV": "from tile: {modid}, recv-ep: {ep:d}",
+        "NOC_WRITE_ACK": "from tile: {modid}, addr: {addr:#010x}, size: {size:d}",
+        "NOC_MSG_ACK": "from tile: {modid}, error: {error}",
+        "NOC_ACK_ERR": "from tile: {modid}, error: {error}",
+        "NOC_ERROR": "from tile: {modid}, addr: {addr:#010x}, error: {error}",
+        "NOC_ERROR_UNEXP": "from tile: {modid}, addr: {addr:#010x}, error: {error}",
+        "NOC_INVMODE": "from tile: {modid}, mode: {mode:d}, addr: {addr:#010x}, burst flag: {burst_flag}, burst length: {burst_length:d}",
+        "NOC_INVFLIT": "from tile: {modid}, mode: {mode:d}, addr: {addr:#010x}, burst flag: {burst_flag}, burst length: {burst_length:d}",
+        "CMD_PRIV_INV_PAGE": "actid: {actid:#x}, virt. page: {virt:#016x}",
+        "CMD_PRIV_INS_TLB": "actid: {actid:#x}, virt. page: {virt:#07x}, phys. page: {phys:#07x}",
+        "CMD_PRIV_XCHG_VPE": "cur_act: {cur_act:#x}, xchg_act: {xchg_act:#x}",
+        "CMD_PRIV_SET_TIMER": "nanos: {nanos:d}",
+        "CMD_PRIV_FINISH": "error: {error}",
+        "PRIV_CORE_REQ_FORMSG": "actid: {actid:#x}, ep: {ep:d}",
+        "PRIV_CORE_REQ_PMPFAIL": "write: {write}, error: {error}, addr: {addr:#x}",
+        "PRIV_TLB_WRITE_ENTRY": "actid: {actid:#x}, virt. page: {virt:#07x}, phys. page: {phys:#07x}, flags: {flags}",
+        "PRIV_TLB_READ_ENTRY": "actid: {actid:#x}, virt. page: {virt:#07x}, read phys. page: {phys:#07x}, flags: {flags}",
+        "PRIV_TLB_DEL_ENTRY": "actid: {actid:#x}, virt. page: {virt:#016x}",
+        "PRIV_CUR_VPE_CHANGE": "old cur_act: {old_cur_act:#x}, new cur_act: {new_cur_act:#x}",
+        "PMP_ACCESS_DENIED": "mode: {mode:d}, addr: {addr:#010x}, size: {size:d}",
+    }
+
+    def decode_tcu_log(version, upper_data64, lower_data64):
+        """
+        Decodes a single TCU log entry into a tuple (time in ns, id string, fields). The fields are a
+        dict with the raw integer values of the log id's fields (e.g., 'modid', 'ep', 'error').
+        """
         log_id = (lower_data64 >> 32) & 0xFF
         log_time = (lower_data64 & 0xFFFFFFFF) << 4    #shift left by 4 to get time in ns
-        id_string = tcu_log.get_tcu_log(log_id)
-        time_string = "Time: {:12}".format(log_time)
-        ret_string = time_string + ", " + id_string + ", "
-
-        if (id_string == "NONE"):
-            return ret_string
+        id_string = LOG.LOG_ID[log_id] if log_id < len(LOG.LOG_ID) else "UNDEFINED"
+        f = {}
 
         #unpriv cmd
         if (id_string == "CMD_SEND"):
-            log_ep = (lower_data64 >> 40) & 0xFFFF
-            log_addr = ((upper_data64 & 0xFFFFFF) << 8) | (lower_data64 >> 56)
-            log_size = (upper_data64 >> 24) & 0xFFFFFFFF
-            log_modid = upper_data64 >> 56
-            return ret_string + "to tile: {}, ep: {:d}, local addr: {:#010x}, size: {:d}".format(modid_to_tile(log_modid), log_ep, log_addr, log_size)
-
-        if (id_string == "CMD_REPLY"):
-            log_ep = (lower_data64 >> 40) & 0xFF
-            log_addr = ((upper_data64 & 0xFFFF) << 16) | (lower_data64 >> 48)
-            log_offset = (upper_data64 >> 16) & 0xFFFFF
-            log_size = (upper_data64 >> 36) & 0xFFFFF
-            log_modid = upper_data64 >> 56
-            return ret_string + "to tile: {}, ep: {:d}, local addr: {:#010x}, msg offset: {:#x}, size: {:d}".format(modid_to_tile(log_modid), log_ep, log_addr, log_offset, log_size)
-
-        if (id_string == "CMD_READ" or id_string == "CMD_WRITE"):
-            log_ep = (lower_data64 >> 40) & 0xFF
-            log_addr = ((upper_data64 & 0xFFFF) << 16) | (lower_data64 >> 48)
-            log_offset = (upper_data64 >> 16) & 0xFFFFF
-            log_size = (upper_data64 >> 36) & 0xFFFFF
-            log_modid = upper_data64 >> 56
-            return ret_string + "to tile: {}, ep: {:d}, local addr: {:#010x}, rem. addr offset: {:#x}, size: {:d}".format(modid_to_tile(log_modid), log_ep, log_addr, log_offset, log_size)
-
-        if (id_string == "CMD_FETCH" or id_string == "CMD_ACK_MSG"):
-            log_ep = (lower_data64 >> 40) & 0xFFFF
-            log_offset = ((upper_data64 & 0xFFFFFF) << 8) | (lower_data64 >> 56)
-            return ret_string + "ep: {:d}, msg offset: {:#x}".format(log_ep, log_offset)
-
-        #unpriv finish
-        if (id_string == "CMD_FINISH"):
-            log_error = (lower_data64 >> 40) & 0x1F
-            return ret_string + "error: {}".format(TCUError.print_error(log_error))
+            f['ep'] = (lower_data64 >> 40) & 0xFFFF
+            f['addr'] = ((upper_data64 & 0xFFFFFF) << 8) | (lower_data64 >> 56)
+            f['size'] = (upper_data64 >> 24) & 0xFFFFFFFF
+            f['modid'] = upper_data64 >> 56
+
+        elif (id_string == "CMD_REPLY" or id_string == "CMD_READ" or id_string == "CMD_WRITE"):
+            f['ep'] = (lower_data64 >> 40) & 0xFF
+            f['addr'] = ((upper_data64 & 0xFFFF) << 16) | (lower_data64 >> 48)
+            f['offset'] = (upper_data64 >> 16) & 0xFFFFF
+            f['size'] = (upper_data64 >> 36) & 0xFFFFF
+            f['modid'] = upper_data64 >> 56
+
+        elif (id_string == "CMD_FETCH" or id_string == "CMD_ACK_MSG"):
+            f['ep'] = (lower_data64 >> 40) & 0xFFFF
+            f['offset'] = ((upper_data64 & 0xFFFFFF) << 8) | (lower_data64 >> 56)
+
+        #unpriv and ext finish
+        elif (id_string == "CMD_FINISH" or id_string == "CMD_EXT_FINISH"):
+            f['error'] = (lower_data64 >> 40) & 0x1F
 
         #msg receive has been finished
-        if (id_string == "RECV_FINISH"):
-            log_occ_mask = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
-            log_unread_mask = (upper_data64 >> 8) & 0xFFFFFFFF
-            log_bitpos = (upper_data64 >> 40) & 0xFFFF
-            return ret_string + "orig. occ. mask: {:#010x}, orig. unread mask: {:#010x}, new set bit pos. in masks: {:#010x}".format(log_occ_mask, log_unread_mask, log_bitpos)
+        elif (id_string == "RECV_FINISH"):
+            f['occ_mask'] = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
+            f['unread_mask'] = (upper_data64 >> 8) & 0xFFFFFFFF
+            f['bitpos'] = (upper_data64 >> 40) & 0xFFFF
 
         #ext cmd
-        if (id_string == "CMD_EXT_INVEP"):
-            log_ep = (lower_data64 >> 40) & 0xFF
-            log_force = (lower_data64 >> 48) & 0x1
-            return ret_string + "ep: {:d}, force: {:d}".format(log_ep, log_force)
-
-        #ext finish
-        if (id_string == "CMD_EXT_FINISH"):
-            log_error = (lower_data64 >> 40) & 0x1F
-            return ret_string + "error: {}".format(TCUError.print_error(log_error))
+        elif (id_string == "CMD_EXT_INVEP"):
+            f['ep'] = (lower_data64 >> 40) & 0xFF
+            f['force'] = (lower_data64 >> 48) & 0x1
 
         #NoC received write or read
-        if (id_string == "NOC_REG_WRITE_ERR" or id_string == "NOC_REG_WRITE" or id_string == "NOC_READ_RSP" or id_string == "NOC_READ_RSP_ERR"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_mode = (lower_data64 >> 48) & 0xF
-            log_addr = ((upper_data64 & 0xFFFFF) << 12) | (lower_data64 >> 52)
-            return ret_string + "from tile: {}, mode: {:d}, local addr: {:#010x}".format(modid_to_tile(log_modid), log_mode, log_addr)
-
-        if (id_string == "NOC_READ_RSP_DONE"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_error = (lower_data64 >> 48) & 0x1F
-            return ret_string + "from tile: {}, error: {}".format(modid_to_tile(log_modid), TCUError.print_error(log_error))
-
-        if (id_string == "NOC_WRITE"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_mode = (lower_data64 >> 48) & 0xF
-            log_addr = ((upper_data64 & 0xFFFFF) << 12) | (lower_data64 >> 52)
-            return ret_string + "from tile: {}, mode: {:d}, local addr: {:#010x}".format(modid_to_tile(log_modid), log_mode, log_addr)
-
-        if (id_string == "NOC_READ_ERR" or id_string == "NOC_READ"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_mode = (lower_data64 >> 48) & 0xF
-            log_addr = ((upper_data64 & 0xFFFFF) << 12) | (lower_data64 >> 52)
-            log_size = upper_data64 >> 20
-            return ret_string + "from tile: {}, mode: {:d}, local addr: {:#010x} size: {:d}".format(modid_to_tile(log_modid), log_mode, log_addr, log_size)
+        elif (id_string == "NOC_REG_WRITE_ERR" or id_string == "NOC_REG_WRITE" or id_string == "NOC_READ_RSP" or
+              id_string == "NOC_READ_RSP_ERR" or id_string == "NOC_WRITE"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['mode'] = (lower_data64 >> 48) & 0xF
+            f['addr'] = ((upper_data64 & 0xFFFFF) << 12) | (lower_data64 >> 52)
+
+        elif (id_string == "NOC_READ_RSP_DONE"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['error'] = (lower_data64 >> 48) & 0x1F
+
+        elif (id_string == "NOC_READ_ERR" or id_string == "NOC_READ"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['mode'] = (lower_data64 >> 48) & 0xF
+            f['addr'] = ((upper_data64 & 0xFFFFF) << 12) | (lower_data64 >> 52)
+            f['size'] = upper_data64 >> 20
 
         #NoC received msg
-        if (id_string == "NOC_MSG" or id_string == "NOC_MSG_INV"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_ep = (lower_data64 >> 48) & 0xFFFF
-            return ret_string + "from tile: {}, recv-ep: {:d}".format(modid_to_tile(log_modid), log_ep)
+        elif (id_string == "NOC_MSG" or id_string == "NOC_MSG_INV"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['ep'] = (lower_data64 >> 48) & 0xFFFF
 
         #NoC received write ACK
-        if (id_string == "NOC_WRITE_ACK"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_addr = ((upper_data64 & 0xFFFF) << 16) | ((lower_data64 >> 48) & 0xFFFF)
-            log_size = (upper_data64 >> 16) & 0xFFFFFFFF
-            return ret_string + "from tile: {}, addr: {:#010x}, size: {:d}".format(modid_to_tile(log_modid), log_addr, log_size)
+        elif (id_string == "NOC_WRITE_ACK"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['addr'] = ((upper_data64 & 0xFFFF) << 16) | ((lower_data64 >> 48) & 0xFFFF)
+            f['size'] = (upper_data64 >> 16) & 0xFFFFFFFF
 
         #NoC received msg ACK or error packet
-        if (id_string == "NOC_MSG_ACK" or id_string == "NOC_ACK_ERR"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_error = (lower_data64 >> 48) & 0x1F
-            return ret_string + "from tile: {}, error: {}".format(modid_to_tile(log_modid), TCUError.print_error(log_error))
+        elif (id_string == "NOC_MSG_ACK" or id_string == "NOC_ACK_ERR"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['error'] = (lower_data64 >> 48) & 0x1F
 
-        if (id_string == "NOC_ERROR" or id_string == "NOC_ERROR_UNEXP"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_addr = ((upper_data64 & 0xFFFF) << 16) | ((lower_data64 >> 48) & 0xFFFF)
-            log_error = (upper_data64 >> 16) & 0x1F
-            return ret_string + "from tile: {}, addr: {:#010x}, error: {}".format(modid_to_tile(log_modid), log_addr, TCUError.print_error(log_error))
+        elif (id_string == "NOC_ERROR" or id_string == "NOC_ERROR_UNEXP"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['addr'] = ((upper_data64 & 0xFFFF) << 16) | ((lower_data64 >> 48) & 0xFFFF)
+            f['error'] = (upper_data64 >> 16) & 0x1F
 
         #NoC received packet with invalid data
-        if (id_string == "NOC_INVMODE" or id_string == "NOC_INVFLIT"):
-            log_modid = (lower_data64 >> 40) & 0xFF
-            log_mode = (lower_data64 >> 48) & 0xF
-            log_addr = ((upper_data64 & 0xFFFFF) << 12) | (lower_data64 >> 52)
-            log_burst_flag = (upper_data64 >> 20) & 0x1
-            log_burst_length = (lower_data64 >> 21) & 0xFFFF
-            return ret_string + "from tile: {}, mode: {:d}, addr: {:#010x}, burst flag: {}, burst length: {:d}".format(modid_to_tile(log_modid), log_mode, log_addr, log_burst_flag, log_burst_length)
+        elif (id_string == "NOC_INVMODE" or id_string == "NOC_INVFLIT"):
+            f['modid'] = (lower_data64 >> 40) & 0xFF
+            f['mode'] = (lower_data64 >> 48) & 0xF
+            f['addr'] = ((upper_data64 & 0xFFFFF) << 12) | (lower_data64 >> 52)
+            f['burst_flag'] = (upper_data64 >> 20) & 0x1
+            f['burst_length'] = (lower_data64 >> 21) & 0xFFFF
 
         #priv. cmds
         #invalidate page
-        if (id_string == "CMD_PRIV_INV_PAGE"):
-            log_actid = (lower_data64 >> 40) & 0xFFFF
-            log_virt = ((upper_data64 & (0xFFFFFFFFFFF if version == 1 else 0xFFF)) << 8) | (lower_data64 >> 56)
-            return ret_string + "actid: {:#x}, virt. page: {:#016x}".format(log_actid, log_virt)
+        elif (id_string == "CMD_PRIV_INV_PAGE"):
+            f['actid'] = (lower_data64 >> 40) & 0xFFFF
+            f['virt'] = ((upper_data64 & (0xFFFFFFFFFFF if version == 1 else 0xFFF)) << 8) | (lower_data64 >> 56)
 
         #insert TLB
-        if (id_string == "CMD_PRIV_INS_TLB"):
-            log_actid = (lower_data64 >> 40) & 0xFFFF
-            log_virt = ((upper_data64 & 0xFFF) << 8) | (lower_data64 >> 56)
-            log_phys = (upper_data64 >> 12) & 0xFFFFF
-            return ret_string + "actid: {:#x}, virt. page: {:#07x}, phys. page: {:#07x}".format(log_actid, log_virt, log_phys)
+        elif (id_string == "CMD_PRIV_INS_TLB"):
+            f['actid'] = (lower_data64 >> 40) & 0xFFFF
+            f['virt'] = ((upper_data64 & 0xFFF) << 8) | (lower_data64 >> 56)
+            f['phys'] = (upper_data64 >> 12) & 0xFFFFF
 
         #xchg_act (act=id+msgs)
-        if (id_string == "CMD_PRIV_XCHG_VPE"):
-            log_curact = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
-            log_xchgact = (upper_data64 >> 8) & 0xFFFFFFFF
-            return ret_string + "cur_act: {:#x}, xchg_act: {:#x}".format(log_curact, log_xchgact)
+        elif (id_string == "CMD_PRIV_XCHG_VPE"):
+            f['cur_act'] = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
+            f['xchg_act'] = (upper_data64 >> 8) & 0xFFFFFFFF
 
         #timer
-        if (id_string == "CMD_PRIV_SET_TIMER"):
-            log_nanos = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
-            return ret_string + "nanos: {:d}".format(log_nanos)
+        elif (id_string == "CMD_PRIV_SET_TIMER"):
+            f['nanos'] = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
 
         #finish
-        if (id_string == "CMD_PRIV_FINISH"):
-            log_error = (lower_data64 >> 40) & 0x1F
-            return ret_string + "error: {}".format(TCUError.print_error(log_error))
+        elif (id_string == "CMD_PRIV_FINISH"):
+            f['error'] = (lower_data64 >> 40) & 0x1F
 
         #core request
-        if (id_string == "PRIV_CORE_REQ_FORMSG"):
-            log_actid = (lower_data64 >> 40) & 0xFFFF
-            log_ep = ((upper_data64 & 0xFF) << 8) | (lower_data64 >> 56)
-            return ret_string + "actid: {:#x}, ep: {:d}".format(log_actid, log_ep)
-
-        if (id_string == "PRIV_CORE_REQ_PMPFAIL"):
-            log_write = (lower_data64 >> 40) & 0x1
-            log_error = (lower_data64 >> 41) & 0x1F
-            log_addr = ((upper_data64 & 0x2FFF) << 18) | (lower_data64 >> 46)
-            return ret_string + "write: {}, error: {}, addr: {:#x}".format(log_write, TCUError.print_error(log_error), log_addr)
-
-        #TLB write
-        if (id_string == "PRIV_TLB_WRITE_ENTRY"):
-            log_tlb_actid = (lower_data64 >> 40) & 0xFFFF
-            log_tlb_virtpage = ((upper_data64 & 0xFFF) << 8) | (lower_data64 >> 56)
-            log_tlb_physpage = (upper_data64 >> 12) & 0xFFFFF
-            log_tlb_flags = (upper_data64 >> 32) & 0x7
-            return ret_string + "actid: {:#x}, virt. page: {:#07x}, phys. page: {:#07x}, flags: {}".format(log_tlb_actid, log_tlb_virtpage, log_tlb_physpage, Flags.flags_bits2str(log_tlb_flags))
-
-        #TLB read
-        if (id_string == "PRIV_TLB_READ_ENTRY"):
-            log_tlb_actid = (lower_data64 >> 40) & 0xFFFF
-            log_tlb_virtpage = ((upper_data64 & 0xFFF) << 8) | (lower_data64 >> 56)
-            log_tlb_physpage = (upper_data64 >> 12) & 0xFFFFF
-            log_tlb_flags = (upper_data64 >> 32) & 0x7
-            return ret_string + "actid: {:#x}, virt. page: {:#07x}, read phys. page: {:#07x}, flags: {}".format(log_tlb_actid, log_tlb_virtpage, log_tlb_physpage, Flags.flags_bits2str(log_tlb_flags))
+        elif (id_string == "PRIV_CORE_REQ_FORMSG"):
+            f['actid'] = (lower_data64 >> 40) & 0xFFFF
+            f['ep'] = ((upper_data64 & 0xFF) << 8) | (lower_data64 >> 56)
+
+        elif (id_string == "PRIV_CORE_REQ_PMPFAIL"):
+            f['write'] = (lower_data64 >> 40) & 0x1
+            f['error'] = (lower_data64 >> 41) & 0x1F
+            f['addr'] = ((upper_data64 & 0x2FFF) << 18) | (lower_data64 >> 46)
+
+        #TLB write and read
+        elif (id_string == "PRIV_TLB_WRITE_ENTRY" or id_string == "PRIV_TLB_READ_ENTRY"):
+            f['actid'] = (lower_data64 >> 40) & 0xFFFF
+            f['virt'] = ((upper_data64 & 0xFFF) << 8) | (lower_data64 >> 56)
+            f['phys'] = (upper_data64 >> 12) & 0xFFFFF
+            f['flags'] = (upper_data64 >> 32) & 0x7
 
         #TLB invalidate page
-        if (id_string == "PRIV_TLB_DEL_ENTRY"):
-            log_tlb_actid = (lower_data64 >> 40) & 0xFFFF
-            log_tlb_virtpage = ((upper_data64 & (0xFFFFFFFFFFF if version == 1 else 0xFFF)) << 8) | (lower_data64 >> 56)
-            return ret_string + "actid: {:#x}, virt. page: {:#016x}".format(log_tlb_actid, log_tlb_virtpage)
+        elif (id_string == "PRIV_TLB_DEL_ENTRY"):
+            f['actid'] = (lower_data64 >> 40) & 0xFFFF
+            f['virt'] = ((upper_data64 & (0xFFFFFFFFFFF if version == 1 else 0xFFF)) << 8) | (lower_data64 >> 56)
 
         #reg CUR_VPE has changed its value
-        if (id_string == "PRIV_CUR_VPE_CHANGE"):
-            log_new_cur_act = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
-            log_old_cur_act = (upper_data64 >> 8) & 0xFFFFFFFF
-            return ret_string + "old cur_act: {:#x}, new cur_act: {:#x}".format(log_old_cur_act, log_new_cur_act)
+        elif (id_string == "PRIV_CUR_VPE_CHANGE"):
+            f['new_cur_act'] = ((upper_data64 & 0xFF) << 24) | (lower_data64 >> 40)
+            f['old_cur_act'] = (upper_data64 >> 8) & 0xFFFFFFFF
 
         #PMP: access from core not allowed
-        if (id_string == "PMP_ACCESS_DENIED"):
-            log_mode = (lower_data64 >> 40) & 0xF
-            log_addr = ((upper_data64 & 0xFFF) << 20) | (lower_data64 >> 44)
-            log_size = (upper_data64 >> 12) & 0xFFFF
-            return ret_string + "mode: {:d}, addr: {:#010x}, size: {:d}".format(log_mode, log_addr, log_size)
+        elif (id_string == "PMP_ACCESS_DENIED"):
+            f['mode'] = (lower_data64 >> 40) & 0xF
+            f['addr'] = ((upper_data64 & 0xFFF) << 20) | (lower_data64 >> 44)
+            f['size'] = (upper_data64 >> 12) & 0xFFFF
+
+        return (log_time, id_string, f)
+
+    def format_tcu_log(log_time, id_string, fields):
+        """
+        Returns the text representation of a decoded TCU log entry
+        """
+        ret_string = "Time: {:12}".format(log_time) + ", " + id_string + ", "
+        if id_string not in LOG.LOG_FORMAT:
+            return ret_string
+
+        #print tiles, errors and flags by name
+        args = dict(fields)
+        if 'modid' in args:
+            args['modid'] = modid_to_tile(args['modid'])
+        if 'error' in args:
+            args['error'] = TCUError.print_error(args['error'])
+        if 'flags' in args:
+            args['flags'] = Flags.flags_bits2str(args['flags'])
+        return ret_string + LOG.LOG_FORMAT[id_string].format(**args)
 
-        return ret_string
+    def split_tcu_log(version, upper_data64, lower_data64):
+        return LOG.format_tcu_log(*LOG.decode_tcu_log(version, upper_data64, lower_data64))
 
     def __init__(self):
         pass
@@ -501,6 +545,53 @@ class TCUStatusReg(Enum):
     BYP_FLIT_COUNT = 3
     DROP_FLIT_COUNT = 4
 
+class TCUUnprivReg(Enum):
+    COMMAND = 0
+    #the address and size of the data (TCU version < 2: single DATA register)
+    DATA_ADDR = 1
+    DATA_SIZE = 2
+    ARG1 = 3
+
+class TCUPrivReg(Enum):
+    CU_REQ = 0
+    PRIV_CTRL = 1
+    PRIV_CMD = 2
+    PRIV_CMD_ARG = 3
+    CUR_ACT = 4
+
+class TCUCmd():
+    IDLE = 0
+    SEND = 1
+    REPLY = 2
+    READ = 3
+    WRITE = 4
+    FETCH = 5
+    ACK_MSG = 6
+
+    def encode(op, ep, arg0=0):
+        return ((arg0 & 0xFFFF_FFFF) << 25) | ((ep & 0xFFFF) << 4) | (op & 0xF)
+
+    def op(cmd):
+        return cmd & 0xF
+
+    def error(cmd):
+        return (cmd >> 20) & 0x1F
+
+class TCUPrivCmd():
+    IDLE = 0
+    INV_PAGE = 1
+    INV_TLB = 2
+    INS_TLB = 3
+    XCHG_ACT = 4
+    SET_TIMER = 5
+    ABORT_CMD = 6
+
+    def encode(op, arg0=0):
+        return ((arg0 & 0x7F_FFFF_FFFF_FFFF) << 9) | (op & 0xF)
+
+    def op(cmd):
+        return cmd & 0xF
+
 class TCUError():
     ERROR_CODES = [
         "NONE",
@@ -547,6 +638,7 @@ class TCU():
     BASE_ADDR = 0xF000_0000
     STATUS_OFF = 0x0000_3000
     CONFIG_OFF = 0x0000_3028
+    PRIV_OFF = 0x0000_2000
     LOG_OFF = 0x0100_0000
 
     def __init__(self, version):
@@ -563,6 +655,30 @@ class TCU():
             return TCU.BASE_ADDR + 0 * 8
         return TCU.BASE_ADDR + 1 * 8
 
+    def unpriv_reg_addr(self, reg):
+        assert isinstance(reg, TCUUnprivReg)
+        #the unprivileged registers follow the external registers
+        if self.version == 2:
+            return TCU.BASE_ADDR + 0x0000_0018 + reg.value * 8
+        assert reg != TCUUnprivReg.DATA_SIZE, "TCU version {} has no DATA_SIZE register".format(self.version)
+        idx = {TCUUnprivReg.COMMAND: 0, TCUUnprivReg.DATA_ADDR: 1, TCUUnprivReg.ARG1: 2}[reg]
+        if self.version == 1:
+            return TCU.BASE_ADDR + 0x0000_0018 + idx * 8
+        return TCU.BASE_ADDR + 0x0000_0010 + idx * 8
+
+    def data_regs(self, addr, size):
+        """
+        Returns the (register address, value) pairs that specify the data for a command
+        """
+        if self.version == 2:
+            return [(self.unpriv_reg_addr(TCUUnprivReg.DATA_ADDR), addr),
+                    (self.unpriv_reg_addr(TCUUnprivReg.DATA_SIZE), size)]
+        return [(self.unpriv_reg_addr(TCUUnprivReg.DATA_ADDR), (size << 32) | addr)]
+
+    def priv_reg_addr(self, reg):
+        assert isinstance(reg, TCUPrivReg)
+        return TCU.BASE_ADDR + TCU.PRIV_OFF + reg.value * 8
+
     def eps_addr(self):
         if self.version == 1:
             return TCU.BASE_ADDR + 0x0000_0040
@@ -578,7 +694,9 @@ class TCU():
         return TCU.BASE_ADDR + TCU.STATUS_OFF + reg.value * 8
 
     def config_reg_addr(self, reg):
-        return TCU.BASE_ADDR + TCU.CONFIG_OFF + reg.value * 8
+        #the config registers are tile specific and therefore also given as integers
+        idx = reg.value if isinstance(reg, Enum) else reg
+        return TCU.BASE_ADDR + TCU.CONFIG_OFF + idx * 8
 
     def log_addr(self):
         return TCU.BASE_ADDR + TCU.LOG_OFF
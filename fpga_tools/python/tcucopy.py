@@ -0,0 +1,160 @@
+"""
+this module copies data between memories with the TCU of a PM instead of via the host
+"""
+import time
+
+from fpga_utils import FPGA_Error
+from tcu import Flags, MemEP, TCUCmd, TCUError, TCUExtReg, TCUPrivCmd, TCUPrivReg, TCUUnprivReg
+
+
+class TCUCopier():
+    """
+    Copies data between DRAM and PM memories by letting the TCU of <pm> execute READ and WRITE
+    commands on memory EPs. The data therefore only travels over the NoC and not via Ethernet.
+    Example:
+
+        copier = TCUCopier(fpga_inst.pms[0], bounce_addr=0x10100000)
+        copier.copy(fpga_inst.dram2.mem, 0, fpga_inst.dram1.mem, 0, 64 * 1024 * 1024)
+
+    If neither source nor destination is the memory of <pm>, the data is copied in chunks of
+    <bounce_size> bytes via a bounce buffer at <bounce_addr> in the memory of <pm>. The EPs
+    <src_ep> and <dst_ep> are used for the copy and restored afterwards.
+
+    The copy falls back to reading and writing via the host if the TCU cannot be used, that is, if
+    the core of the PM is running (it might use the TCU itself), virtual memory is enabled (the TCU
+    would translate the local addresses), or a command fails. A command that does not finish
+    within <timeout> seconds is aborted via the privileged ABORT_CMD command before the EPs are
+    restored; only if that fails as well, an FPGA_Error is raised and the EPs are left untouched.
+    """
+    #the maximum amount of data per command
+    MAX_CMD_SIZE = 1 << 31
+
+    def __init__(self, pm, bounce_addr, bounce_size=64 * 1024, src_ep=126, dst_ep=127, timeout=1.0):
+        self.pm = pm
+        self.tcu = pm.tcu
+        self.bounce_addr = bounce_addr
+        self.bounce_size = bounce_size
+        self.src_ep = src_ep
+        self.dst_ep = dst_ep
+        self.timeout = timeout
+        self._running = False
+
+    def can_offload(self):
+        """
+        Returns true if the TCU of the PM can be used for copies
+        """
+        if self.pm.getEnable():
+            return False
+        features = self.pm.mem[self.tcu.ext_reg_addr(TCUExtReg.FEATURES)]
+        return (features & 0x2) == 0
+
+    def _mem_ep(self, mem, addr, size, flags, act):
+        ep = MemEP()
+        ep.set_chip(mem.nocid[0])
+        ep.set_tile(mem.nocid[1])
+        ep.set_addr(mem.offset + addr)
+        ep.set_size(size)
+        ep.set_flags(flags)
+        ep.set_act(act)
+        return ep
+
+    def _command(self, op, ep, local_addr, size, offset):
+        for (reg, val) in self.tcu.data_regs(local_addr, size):
+            self.pm.mem[reg] = val
+        self.pm.mem[self.tcu.unpriv_reg_addr(TCUUnprivReg.ARG1)] = offset
+        cmd_reg = self.tcu.unpriv_reg_addr(TCUUnprivReg.COMMAND)
+        self.pm.mem[cmd_reg] = TCUCmd.encode(op, ep)
+
+        cmd = self._wait_idle(cmd_reg, TCUCmd.op)
+        if cmd is not None:
+            return TCUCmd.error(cmd)
+
+        print("WARN: %s: TCU command did not finish within %gs; aborting it" % (self.pm.name, self.timeout))
+        self._abort(cmd_reg)
+        return TCUError.ERROR_CODES.index("ABORT")
+
+    def _wait_idle(self, reg, op):
+        #returns the register value once its opcode is idle or None on timeout
+        start = time.time()
+        while True:
+            val = self.pm.mem[reg]
+            if op(val) == 0:
+                return val
+            if time.time() - start > self.timeout:
+                return None
+
+    def _abort(self, cmd_reg):
+        priv_cmd_reg = self.tcu.priv_reg_addr(TCUPrivReg.PRIV_CMD)
+        self.pm.mem[priv_cmd_reg] = TCUPrivCmd.encode(TCUPrivCmd.ABORT_CMD)
+        if self._wait_idle(priv_cmd_reg, TCUPrivCmd.op) is None or self._wait_idle(cmd_reg, TCUCmd.op) is None:
+            #the command might still access the EPs, so that we cannot restore them
+            self._running = True
+            raise FPGA_Error("%s: TCU command could not be aborted; EPs %d and %d are left configured" % (
+                self.pm.name, self.src_ep, self.dst_ep))
+
+    def _host_copy(self, dst_mem, dst_addr, src_mem, src_addr, size):
+        off = 0
+        while off < size:
+            amount = min(1024 * 1024, size - off)
+            data = src_mem.read_bytes(src_addr + off, amount)
+            dst_mem.write_bytes(dst_addr + off, data, burst=(dst_addr + off) % 16 == 0)
+            off += amount
+
+    def _overlaps_bounce(self, mem, addr, size):
+        return mem.nocid == self.pm.nocid and \
+            addr < self.bounce_addr + self.bounce_size and self.bounce_addr < addr + size
+
+    def copy(self, dst_mem, dst_addr, src_mem, src_addr, size):
+        """
+        Copies <size> bytes from <src_addr> in <src_mem> to <dst_addr> in <dst_mem>. Returns true if
+        the data has been copied by the TCU and false if it has been copied via the host.
+        """
+        if size == 0:
+            return True
+        if not self.can_offload():
+            self._host_copy(dst_mem, dst_addr, src_mem, src_addr, size)
+            return False
+
+        src_local = src_mem.nocid == self.pm.nocid
+        dst_local = dst_mem.nocid == self.pm.nocid
+        bounce = not src_local and not dst_local
+        if bounce:
+            assert not self._overlaps_bounce(src_mem, src_addr, size), "source overlaps bounce buffer"
+            assert not self._overlaps_bounce(dst_mem, dst_addr, size), "destination overlaps bounce buffer"
+
+        act = self.pm.mem[self.tcu.priv_reg_addr(TCUPrivReg.CUR_ACT)] & 0xFFFF
+        saved = {self.src_ep: self.pm.tcu_get_ep(self.src_ep), self.dst_ep: self.pm.tcu_get_ep(self.dst_ep)}
+        self.pm.tcu_set_eps({
+            self.src_ep: self._mem_ep(src_mem, src_addr, size, Flags.READ, act),
+            self.dst_ep: self._mem_ep(dst_mem, dst_addr, size, Flags.WRITE, act),
+        })
+
+        off = 0
+        self._running = False
+        try:
+            chunk = self.bounce_size if bounce else self.MAX_CMD_SIZE
+            while off < size:
+                amount = min(chunk, size - off)
+                if dst_local:
+                    #read directly into the destination
+                    err = self._command(TCUCmd.READ, self.src_ep, dst_addr + off, amount, off)
+                elif src_local:
+                    #write directly from the source
+                    err = self._command(TCUCmd.WRITE, self.dst_ep, src_addr + off, amount, off)
+                else:
+                    err = self._command(TCUCmd.READ, self.src_ep, self.bounce_addr, amount, off)
+                    if err == 0:
+                        err = self._command(TCUCmd.WRITE, self.dst_ep, self.bounce_addr, amount, off)
+                if err != 0:
+                    print("WARN: %s: TCU copy failed with %s; falling back to host copy" % (
+                        self.pm.name, TCUError.print_error(err)))
+                    break
+                off += amount
+        finally:
+            if not self._running:
+                self.pm.tcu_set_eps(saved)
+
+        if off < size:
+            self._host_copy(dst_mem, dst_addr + off, src_mem, src_addr + off, size - off)
+            return False
+        return True
@@ -0,0 +1,261 @@
+"""
+this module provides structured access to the TCU logs of the tiles for offline analysis
+"""
+import struct
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+
+from tcu import LOG, modid_to_tile
+
+
+class LogEntry():
+    """
+    a single decoded TCU log entry. <tile> is the name of the tile that wrote the log, <idx> the
+    position in the log memory, <time> the unwrapped time in ns and <fields> the decoded fields (see
+    LOG.decode_tcu_log).
+    """
+    __slots__ = ['tile', 'idx', 'time', 'id', 'fields']
+
+    def __init__(self, tile, idx, time, id, fields):
+        self.tile = tile
+        self.idx = idx
+        self.time = time
+        self.id = id
+        self.fields = fields
+
+    def get(self, field, default=None):
+        return self.fields.get(field, default)
+
+    def __repr__(self):
+        return "%s:%5d: %s" % (self.tile, self.idx, LOG.format_tcu_log(self.time, self.id, self.fields))
+
+
+class TCULog():
+    """
+    the raw TCU log of one tile
+    """
+    FILE_MAGIC = b'TLOG'
+    FILE_HEADER = struct.Struct('<4sBBHQ')
+
+    #the log stores the lower 32 bits of the time in units of 16 ns
+    TIME_WRAP = 1 << 36
+
+    def __init__(self, version, modid, log_count, words):
+        self.version = version
+        self.modid = modid
+        self.tile = modid_to_tile(modid)
+        self.log_count = log_count
+        self.words = words
+        #the wrap-around offset of the first entry (see align)
+        self.epoch = 0
+        self._entries = None
+
+    def from_pm(pm, all=False):
+        (log_count, words) = pm.tcu_read_log(all)
+        return TCULog(pm.tcu.version, pm.nocid[1], log_count, words)
+
+    def load(filename):
+        """
+        Loads a log that has been stored with save()
+        """
+        with open(filename, 'rb') as fh:
+            (magic, version, modid, _, log_count) = TCULog.FILE_HEADER.unpack(fh.read(TCULog.FILE_HEADER.size))
+            assert magic == TCULog.FILE_MAGIC, "%s is no TCU log file" % filename
+            data = fh.read()
+        words = list(struct.unpack('<%dQ' % (len(data) // 8), data))
+        return TCULog(version, modid, log_count, words)
+
+    def save(self, filename):
+        """
+        Stores the raw log in a binary file
+        """
+        with open(filename, 'wb') as fh:
+            fh.write(self.FILE_HEADER.pack(self.FILE_MAGIC, self.version, self.modid, 0, self.log_count))
+            fh.write(struct.pack('<%dQ' % len(self.words), *self.words))
+
+    def __len__(self):
+        return len(self.words) // 2
+
+    def write_text(self, fh):
+        """
+        Writes the log in text form to the given file handle (in log-memory order)
+        """
+        if self.log_count > len(self):
+            fh.write("%s: Number of TCU log messages: %d (only %d shown, last log at %d)\n" % (
+                self.tile, self.log_count, len(self), self.log_count % len(self) - 1))
+        else:
+            fh.write("%s: Number of TCU log messages: %d\n" % (self.tile, self.log_count))
+
+        for i in range(len(self)):
+            fh.write("%5d: %s\n" % (i, LOG.split_tcu_log(self.version, self.words[i * 2 + 1], self.words[i * 2])))
+
+    def write_text_file(self, filename):
+        with open(filename, 'w') as fh:
+            self.write_text(fh)
+
+    def entries(self):
+        """
+        Returns the decoded log entries in chronological order. The log memory is a ring buffer,
+        so that the oldest entry is not at index 0 anymore once the TCU has wrapped around. The time
+        is unwrapped as well and thus monotonic within one log. Empty entries are skipped.
+
+        Each log is unwrapped starting at <epoch>, so that the times of different logs are only
+        comparable after aligning them with align().
+        """
+        if self._entries is None:
+            self._entries = []
+            wraps = self.epoch
+            last_time = 0
+            for (idx, time, id, fields) in self._raw_entries():
+                if time < last_time:
+                    wraps += self.TIME_WRAP
+                last_time = time
+                self._entries.append(LogEntry(self.tile, idx, time + wraps, id, fields))
+        return self._entries
+
+    def _raw_entries(self):
+        count = len(self)
+        first = self.log_count % count if self.log_count > count else 0
+        for i in range(count):
+            idx = (first + i) % count
+            (time, id, fields) = LOG.decode_tcu_log(self.version, self.words[idx * 2 + 1], self.words[idx * 2])
+            #unused log memory (only read with all=True)
+            if id != "NONE":
+                yield (idx, time, id, fields)
+
+    def _first_time(self):
+        for (_, time, _, _) in self._raw_entries():
+            return time
+        return None
+
+    def align(logs):
+        """
+        Unwraps the times of the given logs against a common reference: the first entry of each log
+        is placed within half a wrap-around (2^35 ns) of the first entry of the first log, so that
+        logs that start on different sides of a wrap-around get the same epoch. This assumes that
+        the logs start less than half a wrap-around apart.
+        """
+        firsts = [(log, log._first_time()) for log in logs]
+        firsts = [(log, time) for (log, time) in firsts if time is not None]
+        if not firsts:
+            return
+        ref = firsts[0][1]
+        half = TCULog.TIME_WRAP // 2
+        epochs = [-((time - ref + half) // TCULog.TIME_WRAP) * TCULog.TIME_WRAP for (_, time) in firsts]
+        #keep all times positive
+        base = min(epochs)
+        for ((log, _), epoch) in zip(firsts, epochs):
+            log.epoch = epoch - base
+            log._entries = None
+
+
+class LogIndex():
+    """
+    an index over the decoded logs of multiple tiles. The logs are aligned to a common time base
+    (see TCULog.align) and the entries are decoded once and indexed by log id, logging tile, peer
+    tile (the 'modid' field), EP, activity and time, so that queries only touch the matching
+    entries. Example:
+
+        idx = LogIndex([TCULog.from_pm(pm) for pm in fpga_inst.pms])
+        idx.query(id="CMD_PRIV_XCHG_VPE", tile="PM3", start=t1, end=t2)
+        idx.query(id="NOC_ERROR", peer="DRAM1")
+    """
+    def __init__(self, logs):
+        TCULog.align(logs)
+        self.entries = []
+        self.acts = []
+        for log in logs:
+            #the activity of entries without 'actid' field is the current one on that tile
+            cur_act = None
+            for e in log.entries():
+                if e.id == "PRIV_CUR_VPE_CHANGE":
+                    cur_act = e.get('new_cur_act') & 0xFFFF
+                elif e.id == "CMD_PRIV_XCHG_VPE":
+                    cur_act = e.get('xchg_act') & 0xFFFF
+                self.entries.append(e)
+                self.acts.append(e.get('actid', cur_act))
+
+        order = sorted(range(len(self.entries)), key=lambda i: self.entries[i].time)
+        self.entries = [self.entries[i] for i in order]
+        self.acts = [self.acts[i] for i in order]
+        self.times = [e.time for e in self.entries]
+
+        self.by_id = defaultdict(list)
+        self.by_tile = defaultdict(list)
+        self.by_peer = defaultdict(list)
+        self.by_ep = defaultdict(list)
+        self.by_act = defaultdict(list)
+        self.peers = []
+        for (pos, e) in enumerate(self.entries):
+            self.by_id[e.id].append(pos)
+            self.by_tile[e.tile].append(pos)
+            self.peers.append(modid_to_tile(e.fields['modid']) if 'modid' in e.fields else None)
+            if self.peers[pos] is not None:
+                self.by_peer[self.peers[pos]].append(pos)
+            if 'ep' in e.fields:
+                self.by_ep[e.fields['ep']].append(pos)
+            if self.acts[pos] is not None:
+                self.by_act[self.acts[pos]].append(pos)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _values(values, conv=None):
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        return set(conv(v) for v in values) if conv else set(values)
+
+    def _tile_name(tile):
+        return modid_to_tile(tile) if isinstance(tile, int) else tile
+
+    def query(self, id=None, tile=None, peer=None, ep=None, act=None, start=None, end=None):
+        """
+        Returns all entries in chronological order that match all given filters. <id>, <tile>,
+        <peer>, <ep> and <act> can be a single value or a list of values. Tiles are given by name
+        (e.g., "PM3") or modid. <start> and <end> denote the time range [start, end) in ns.
+        """
+        filters = []
+        if id is not None:
+            filters.append((self.by_id, LogIndex._values(id), lambda pos: self.entries[pos].id))
+        if tile is not None:
+            filters.append((self.by_tile, LogIndex._values(tile, LogIndex._tile_name),
+                            lambda pos: self.entries[pos].tile))
+        if peer is not None:
+            filters.append((self.by_peer, LogIndex._values(peer, LogIndex._tile_name),
+                            lambda pos: self.peers[pos]))
+        if ep is not None:
+            filters.append((self.by_ep, LogIndex._values(ep), lambda pos: self.entries[pos].get('ep')))
+        if act is not None:
+            filters.append((self.by_act, LogIndex._values(act), lambda pos: self.acts[pos]))
+
+        #restrict the search to the time range first
+        lo = 0 if start is None else bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect_left(self.times, end)
+        if not filters:
+            return self.entries[lo:hi]
+
+        #walk the shortest posting list within the time range and check the remaining filters
+        best = None
+        for (num, (index, values, _)) in enumerate(filters):
+            ranges = []
+            for v in values:
+                postings = index.get(v, [])
+                ranges.append((postings, bisect_left(postings, lo), bisect_left(postings, hi)))
+            size = sum(b - a for (_, a, b) in ranges)
+            if best is None or size < best[1]:
+                best = (num, size, ranges)
+
+        (num, _, ranges) = best
+        if len(ranges) == 1:
+            (postings, a, b) = ranges[0]
+            candidates = postings[a:b]
+        else:
+            candidates = heapq.merge(*[postings[a:b] for (postings, a, b) in ranges])
+
+        others = [(values, key) for (i, (_, values, key)) in enumerate(filters) if i != num]
+        return [self.entries[pos] for pos in candidates
+                if all(key(pos) in values for (values, key) in others)]
+
+    def count(self, **kwargs):
+        return len(self.query(**kwargs))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+import traceback
+import sys
+
+import fpga_top
+from noc import NoCmonitor
+from tcu import EP, RecvEP
+from fpga_utils import FPGA_Error
+
+# sizes of the message header depending on the TCU version
+HEADER_SIZE = {0: 16, 1: 32, 2: 32}
+
+# the largest message the host can send
+MAX_MSG_SIZE = 2048 - 32
+
+def popcount(val):
+    return bin(val).count('1')
+
+def reset_ep(pm, ep_id, buf, slots, slot_size):
+    # a freshly configured EP has an empty ring
+    ep = RecvEP()
+    ep.set_buffer(buf)
+    ep.set_slots(slots)
+    ep.set_slot_size(slot_size)
+    pm.tcu_set_ep(ep_id, ep)
+
+def measure_readback(pm, ep_id, rounds):
+    # the time to read an EP back without preceding messages
+    start = time.time()
+    for _ in range(rounds):
+        pm.tcu_get_ep(ep_id)
+    return (time.time() - start) / rounds
+
+def measure(pm, ep_id, buf, size, slots, batch, rounds, vectored, readback):
+    nocif = pm.mem.nocif
+    slot_size = (size + HEADER_SIZE[nocif.tcu.version] - 1).bit_length()
+    payload = bytes(i & 0xFF for i in range(size))
+    msgs = [(pm.nocid, ep_id, payload)] * batch
+
+    sent = 0
+    delivered = 0
+    elapsed = 0
+    for _ in range(rounds):
+        reset_ep(pm, ep_id, buf, slots, slot_size)
+
+        start = time.time()
+        if vectored:
+            nocif.send_bytes_vec(msgs)
+        else:
+            for (trg_id, trg_ep, data) in msgs:
+                nocif.send_bytes(trg_id, trg_ep, data)
+        # reading the EP back waits until the messages have arrived; its own duration is
+        # subtracted below
+        ep = pm.tcu_get_ep(ep_id)
+        elapsed += time.time() - start
+
+        sent += batch
+        delivered += popcount(ep.occupied())
+
+    elapsed = max(elapsed - rounds * readback, 1e-9)
+    return {
+        'size': size,
+        'batch': batch,
+        'sent': sent,
+        'delivered': delivered,
+        'msgs_per_sec': delivered / elapsed,
+        'bytes_per_sec': delivered * size / elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fpga', type=int)
+    parser.add_argument('--reset', action='store_true')
+    parser.add_argument('--pm', type=int, default=0)
+    parser.add_argument('--ep', type=int, default=16)
+    parser.add_argument('--buf', type=lambda x: int(x, 0), default=0x10100000)
+    parser.add_argument('--slots', type=int, default=5, help='log2 of the number of slots (at most 5)')
+    parser.add_argument('--batch', type=int, default=None,
+                        help='largest number of messages per round (default and at most: the slots)')
+    parser.add_argument('--rounds', type=int, default=100)
+    parser.add_argument('--single', action='store_true', help='send the messages one by one')
+    args = parser.parse_args()
+
+    fpga_inst = fpga_top.FPGA_TOP(args.fpga)
+    if args.reset:
+        fpga_inst.eth_rf.system_reset()
+
+    mon = NoCmonitor()
+
+    pm = fpga_inst.pms[args.pm]
+    max_batch = args.batch if args.batch is not None else 1 << args.slots
+    assert max_batch <= 1 << args.slots, "the batch must fit into the 2^%d slots" % args.slots
+    batches = [1 << i for i in range(max_batch.bit_length()) if 1 << i < max_batch] + [max_batch]
+
+    print("Starting test")
+    print("Sending up to %d messages per round to %s EP%d with 2^%d slots (%s)" % (
+        max_batch, pm.name, args.ep, args.slots, "single" if args.single else "vectored"))
+
+    readback = measure_readback(pm, args.ep, args.rounds)
+    print("Reading the EP back takes %.1f us (subtracted)" % (readback * 1e6))
+    print("{:>6} {:>6} {:>8} {:>10} {:>10} {:>10}".format(
+        "size", "batch", "sent", "delivered", "msgs/s", "MB/s"))
+
+    sizes = [16 << i for i in range(7)] + [MAX_MSG_SIZE]
+    for size in sizes:
+        # the smallest batch for which not all messages reach the ring
+        saturation = None
+        for batch in batches:
+            res = measure(pm, args.ep, args.buf, size, args.slots, batch, args.rounds, not args.single,
+                          readback)
+            print("{:>6} {:>6} {:>8} {:>10} {:>10.0f} {:>10.2f}".format(
+                res['size'], res['batch'], res['sent'], res['delivered'], res['msgs_per_sec'],
+                res['bytes_per_sec'] / 1e6))
+            if saturation is None and res['delivered'] < res['sent']:
+                saturation = batch
+        if saturation is None:
+            print("{:>6} occupancy does not saturate up to a batch of {}".format(size, max_batch))
+        else:
+            print("{:>6} occupancy saturates at a batch of {}".format(size, saturation))
+
+    # leave the EP invalid
+    pm.tcu_set_ep(args.ep, EP.invalid())
+
+    print("All tests succeeded")
+
+try:
+    main()
+except FPGA_Error as e:
+    sys.stdout.flush()
+    traceback.print_exc()
+except Exception:
+    sys.stdout.flush()
+    traceback.print_exc()
+except KeyboardInterrupt:
+    print("interrupt")